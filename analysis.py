@@ -0,0 +1,105 @@
+"""Page model and scoring shared by the analysis endpoints.
+
+Pages are parsed into a PageModel by one of the backends in parsers.py and
+scored by the rules in rules.py.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
+
+from keywords import term_counts, top_terms
+from metrics import timer
+from rules import DEFAULT_PLAN, run_rules
+
+# Elements whose text never renders as page content
+SKIP_TAGS = {"script", "style", "noscript", "template", "title"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+TOKEN_RE = re.compile(r"\w+")
+
+
+@dataclass
+class PageModel:
+    title: str = ""
+    meta_description: Optional[str] = None
+    headings: Dict[str, List[str]] = field(default_factory=dict)
+    robots: Optional[str] = None
+    canonical: Optional[str] = None
+    text: str = ""
+    tokens: List[str] = field(default_factory=list)
+    # keyword term counts, filled in instead of tokens by the streaming analyzer
+    term_counts: Optional[Dict[str, int]] = None
+    word_count: int = 0
+    links: List[str] = field(default_factory=list)
+
+    @property
+    def h1(self) -> Optional[str]:
+        h1s = self.headings.get("h1")
+        return h1s[0] if h1s else None
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+
+def finish_page(page: PageModel, pieces: List[str]) -> PageModel:
+    """Fill the text-derived fields of ``page`` from its visible text pieces."""
+    page.text = " ".join(pieces)
+    page.tokens = tokenize(page.text)
+    page.word_count = len(page.text.split())
+    return page
+
+
+def calculate_score(page: PageModel, head_only: bool = False, plan: str = DEFAULT_PLAN):
+    """Score and issues from the plan's rules in rules.py; ``head_only`` runs just the head rules."""
+    with timer("score"):
+        return run_rules(page, plan, head_only)
+
+
+def page_terms(page: PageModel) -> Dict[str, int]:
+    """Keyword term counts of ``page``: kept by the streaming analyzer, else counted from its tokens."""
+    return page.term_counts if page.term_counts is not None else term_counts(page.tokens)
+
+
+def extract_keywords(source: Union[PageModel, str], k: int = 10):
+    """Top ``k`` keywords and phrases by TF-IDF against the audited-page corpus."""
+    with timer("keywords"):
+        counts = page_terms(source) if isinstance(source, PageModel) else term_counts(tokenize(source))
+        return top_terms(counts, k)
+
+
+def build_audit(url: str, page: PageModel, plan: str = DEFAULT_PLAN):
+    """Full audit payload for ``url``: overview, issues, keywords and brief."""
+    score, issues = calculate_score(page, plan=plan)
+    keywords = extract_keywords(page)
+
+    outline = [
+        {"title": "Introduction", "description": "Define topic and explain importance"},
+        {"title": "Why It Matters", "description": "Show business impact"},
+        {"title": "How-To Guide", "description": "Step-by-step implementation"},
+        {"title": "Best Practices", "description": "Tips and recommendations"},
+        {"title": "Conclusion & CTA", "description": "Summarize and drive action"}
+    ]
+
+    return {
+        "url": url,
+        "overview": {
+            "score": score,
+            "title": page.title or "No title",
+            "metaDescription": page.meta_description if page.meta_description is not None else "No meta description",
+            "h1": page.h1 if page.h1 is not None else "No H1",
+            "wordCount": page.word_count
+        },
+        "issues": issues,
+        "keywords": keywords[:10],
+        "brief": {
+            "outline": outline,
+            "wordCount": {"min": 1200, "max": 1800},
+            "checklist": [
+                "Use primary keywords in title and H1",
+                "Add compelling meta description (150-160 chars)",
+                "Structure content with clear H2/H3 headings",
+                "Include internal links to related pages",
+                "Add clear call-to-action"
+            ]
+        }
+    }
@@ -0,0 +1,254 @@
+"""Indexed analytics store in the db.py SQLite database.
+
+Every event is kept in ``analyticsevent`` (indexed by type and time) and also
+counted into hourly ``analyticscounter`` buckets as it is written, so stats
+queries read a few counter rows instead of scanning the event history.
+
+Request handlers emit events into AnalyticsSink, which buffers them and has a
+single writer flush batches to the store and to the raw ANALYTICS_FILE log.
+The raw log is rotated at ANALYTICS_SEGMENT_BYTES and old segments gzipped.
+
+Import an existing analytics.jsonl with: python analytics.py import analytics.jsonl
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+ANALYTICS_FILE = Path(os.getenv("ANALYTICS_FILE", "analytics.jsonl"))
+ANALYTICS_BUFFER = int(os.getenv("ANALYTICS_BUFFER", "10000"))
+ANALYTICS_BATCH = int(os.getenv("ANALYTICS_BATCH", "500"))
+ANALYTICS_FLUSH_SECONDS = float(os.getenv("ANALYTICS_FLUSH_SECONDS", "1.0"))
+ANALYTICS_SEGMENT_BYTES = int(os.getenv("ANALYTICS_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+BUCKET_SECONDS = 3600
+INTERVALS = {"hour": 3600, "day": 86400}
+IMPORT_BATCH = 5000
+# a batch that keeps failing is retried with backoff this many times, then dropped
+ANALYTICS_RETRIES = int(os.getenv("ANALYTICS_RETRIES", "5"))
+ANALYTICS_RETRY_SECONDS = float(os.getenv("ANALYTICS_RETRY_SECONDS", "0.5"))
+
+logger = logging.getLogger(__name__)
+
+# db and SQLAlchemy are slow to import; the store functions load them on first use
+
+
+def _bucket(ts: float) -> int:
+    return int(ts) // BUCKET_SECONDS * BUCKET_SECONDS
+
+
+def record_events(events: Iterable[Tuple[float, str, dict]]) -> int:
+    """Store ``(ts, event_type, data)`` events and bump their hourly counters in one transaction."""
+    rows = [{"ts": int(ts), "et": et, "data": json.dumps(d)} for ts, et, d in events]
+    if not rows:
+        return 0
+    from sqlalchemy import insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from db import AnalyticsCounter, AnalyticsEvent, engine
+
+    events_table, counters_table = AnalyticsEvent.__table__, AnalyticsCounter.__table__
+    counts = Counter((r["et"], _bucket(r["ts"])) for r in rows)
+    upsert = sqlite_insert(counters_table)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=["et", "bucket"],
+        set_={"count": counters_table.c.count + upsert.excluded.count},
+    )
+    with engine.begin() as conn:
+        conn.execute(insert(events_table), rows)
+        conn.execute(upsert, [{"et": et, "bucket": b, "count": n} for (et, b), n in counts.items()])
+    return len(rows)
+
+
+def record_event(et: str, d: dict, ts: Optional[float] = None) -> None:
+    record_events([(time.time() if ts is None else ts, et, d)])
+
+
+def _epoch(value: Optional[datetime]) -> Optional[int]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return int(value.timestamp())
+
+
+def event_stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    events: Optional[List[str]] = None,
+    interval: Optional[str] = None,
+) -> dict:
+    """Event counts by type, optionally as an hourly or daily series.
+
+    Ranges are resolved to whole hours: ``since`` rounds down, ``until`` is exclusive.
+    """
+    from sqlalchemy import func, select
+    from db import AnalyticsCounter, engine
+
+    c = AnalyticsCounter.__table__.c
+    where = []
+    if since is not None:
+        where.append(c.bucket >= _bucket(_epoch(since)))
+    if until is not None:
+        where.append(c.bucket < _epoch(until))
+    if events:
+        where.append(c.et.in_(events))
+    with engine.connect() as conn:
+        totals = conn.execute(select(c.et, func.sum(c.count)).where(*where).group_by(c.et)).all()
+        result = {"events": {et: int(n) for et, n in totals}}
+        if interval:
+            size = INTERVALS[interval]
+            period = (c.bucket // size) * size
+            rows = conn.execute(
+                select(period, c.et, func.sum(c.count)).where(*where).group_by(period, c.et).order_by(period)
+            ).all()
+            result["series"] = [
+                {"t": datetime.fromtimestamp(t, timezone.utc).isoformat(), "et": et, "count": int(n)}
+                for t, et, n in rows
+            ]
+    return result
+
+
+def append_log(events: List[Tuple[float, str, dict]], path: Path = ANALYTICS_FILE) -> None:
+    """Append events to the raw JSONL log in one write, rotating it when it gets too big."""
+    lines = "".join(
+        json.dumps({"ts": datetime.fromtimestamp(ts).isoformat(), "et": et, "d": d}) + "\n"
+        for ts, et, d in events
+    )
+    with open(path, "a") as f:
+        f.write(lines)
+        size = f.tell()
+    if size >= ANALYTICS_SEGMENT_BYTES:
+        rotate_log(path)
+
+
+def rotate_log(path: Path = ANALYTICS_FILE) -> Optional[Path]:
+    """Move the current log aside as a timestamped segment and gzip it."""
+    segment = path.with_name(f"{path.stem}-{datetime.now():%Y%m%d%H%M%S%f}-{os.getpid()}{path.suffix}")
+    try:
+        os.replace(path, segment)
+    except FileNotFoundError:
+        # another worker rotated it first
+        return None
+    compressed = segment.with_name(segment.name + ".gz")
+    with open(segment, "rb") as src, gzip.open(compressed, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    segment.unlink()
+    return compressed
+
+
+class AnalyticsSink:
+    """Buffer events in memory and flush them in batches through one writer task.
+
+    ``emit`` waits when the buffer is full, pushing back on the handlers
+    instead of growing without bound. ``stop`` flushes whatever is buffered.
+    A failed write (e.g. "database is locked") is logged and the batch
+    retried with backoff; the writer keeps running either way.
+    """
+
+    def __init__(
+        self,
+        path: Path = ANALYTICS_FILE,
+        maxsize: int = ANALYTICS_BUFFER,
+        batch_size: int = ANALYTICS_BATCH,
+        interval: float = ANALYTICS_FLUSH_SECONDS,
+        retries: int = ANALYTICS_RETRIES,
+        retry_delay: float = ANALYTICS_RETRY_SECONDS,
+    ):
+        self.path = path
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _write(self, batch: List[Tuple[float, str, dict]]) -> None:
+        append_log(batch, self.path)
+        record_events(batch)
+
+    async def _flush(self, batch: List[Tuple[float, str, dict]]) -> None:
+        """Write ``batch``, retrying failures; the raw log is only appended once."""
+        logged = False
+        for attempt in range(self.retries + 1):
+            try:
+                if not logged:
+                    await asyncio.to_thread(append_log, batch, self.path)
+                    logged = True
+                await asyncio.to_thread(record_events, batch)
+                return
+            except Exception:
+                logger.exception("analytics flush of %d events failed (attempt %d)", len(batch), attempt + 1)
+            if attempt < self.retries:
+                await asyncio.sleep(self.retry_delay * 2 ** attempt)
+        logger.error("dropping %d analytics events after %d attempts", len(batch), self.retries + 1)
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(self.maxsize)
+        self._task = asyncio.ensure_future(self._writer())
+
+    async def emit(self, et: str, d: dict) -> None:
+        event = (time.time(), et, d)
+        if self._task is None or self._task.done():
+            # not running (scripts, or after shutdown): write through
+            await asyncio.to_thread(self._write, [event])
+            return
+        await self.queue.put(event)
+
+    async def _writer(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await self.queue.get()
+            if event is None:
+                return
+            batch, deadline = [event], loop.time() + self.interval
+            while len(batch) < self.batch_size:
+                try:
+                    event = await asyncio.wait_for(self.queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                if event is None:
+                    await self._flush(batch)
+                    return
+                batch.append(event)
+            await self._flush(batch)
+
+    async def stop(self) -> None:
+        if self._task is None or self._task.done():
+            return
+        await self.queue.put(None)
+        await self._task
+
+
+analytics_sink = AnalyticsSink()
+
+
+def import_jsonl(path: str) -> int:
+    """Load a legacy analytics.jsonl log (naive local ISO timestamps) into the store."""
+    total, batch = 0, []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            e = json.loads(line)
+            batch.append((datetime.fromisoformat(e["ts"]).timestamp(), e.get("et", ""), e.get("d", {})))
+            if len(batch) >= IMPORT_BATCH:
+                total += record_events(batch)
+                batch = []
+    return total + record_events(batch)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "import":
+        sys.exit("usage: python analytics.py import analytics.jsonl")
+    from db import create_db_and_tables
+
+    create_db_and_tables()
+    print(f"imported {import_jsonl(sys.argv[2])} events")
@@ -0,0 +1,62 @@
+"""Compare two benchmark result files from bench.run.
+
+Usage: python -m bench.compare BASE.json NEW.json [--threshold 10]
+
+Prints the change of every benchmark present in both files: the median time
+for micro benchmarks, and the throughput and p50 latency for endpoints. Exits
+1 when anything is slower than BASE by more than --threshold percent.
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _change(base: float, new: float) -> float:
+    """Percent change, positive when ``new`` is worse, for a lower-is-better value."""
+    return (new - base) / base * 100 if base else 0.0
+
+
+def compare(base: dict, new: dict, threshold: float) -> int:
+    regressions = 0
+    if base["meta"].get("corpus") != new["meta"].get("corpus"):
+        print("warning: results were measured on different corpora")
+    print(f"base {base['meta'].get('commit')} ({base['meta'].get('time')})  "
+          f"new {new['meta'].get('commit')} ({new['meta'].get('time')})\n")
+
+    rows = []
+    for key, b in base.get("micro", {}).items():
+        n = new.get("micro", {}).get(key)
+        if n:
+            rows.append((key, "median ms", b["median_ms"], n["median_ms"], _change(b["median_ms"], n["median_ms"])))
+    for key, b in base.get("endpoints", {}).items():
+        n = new.get("endpoints", {}).get(key)
+        if n:
+            # throughput is higher-is-better: compare its inverse
+            rows.append((key, "req/s", b["rps"], n["rps"], _change(1 / b["rps"], 1 / n["rps"]) if n["rps"] else 100.0))
+            rows.append((key, "p50 ms", b["p50_ms"], n["p50_ms"], _change(b["p50_ms"], n["p50_ms"])))
+
+    print(f"{'benchmark':<34}{'metric':<11}{'base':>12}{'new':>12}{'change':>10}")
+    for key, metric, b, n, change in rows:
+        flag = ""
+        if change > threshold:
+            flag, regressions = "  SLOWER", regressions + 1
+        elif change < -threshold:
+            flag = "  faster"
+        print(f"{key:<34}{metric:<11}{b:>12.3f}{n:>12.3f}{change:>+9.1f}%{flag}")
+    print(f"\n{len(rows)} compared, {regressions} slower by more than {threshold:g}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("base", type=Path)
+    parser.add_argument("new", type=Path)
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent")
+    args = parser.parse_args()
+    base, new = (json.loads(p.read_text()) for p in (args.base, args.new))
+    sys.exit(1 if compare(base, new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
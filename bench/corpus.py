@@ -0,0 +1,114 @@
+"""Deterministic HTML fixture corpus for the benchmark suite.
+
+Usage: python -m bench.corpus [--out bench/corpus]
+
+Pages from a few KB to 20 MB are generated from a fixed seed rather than
+checked in, so every checkout benchmarks byte-identical input. The manifest
+records each page's size and sha256; results carry the corpus digest so runs
+on different corpora are not compared by mistake.
+"""
+import argparse
+import hashlib
+import json
+import random
+from pathlib import Path
+from typing import Dict, List
+
+CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+SEED = 20240101
+# name -> approximate body size in bytes
+PAGES = {
+    "tiny": 2 * 1024,
+    "small": 30 * 1024,
+    "medium": 300 * 1024,
+    "large": 3 * 1024 * 1024,
+    "huge": 20 * 1024 * 1024,
+}
+TOPICS = [
+    "technical seo audit", "page speed optimization", "structured data markup",
+    "internal linking strategy", "content marketing plan", "keyword research tools",
+]
+WORDS = (
+    "the of and to in a is that for it as was with be by on not he this are or his from at which but have an "
+    "they you were her she there been one all we their has would when if so no what can more out other up "
+    "search engine ranking content page site crawl index link title description heading keyword traffic "
+    "audit speed mobile render schema canonical sitemap robots backlink anchor snippet query intent user "
+    "conversion analytics report score issue performance image video market product customer brand guide"
+).split()
+
+
+def _words(rng: random.Random, weights: List[float], n: int) -> str:
+    return " ".join(rng.choices(WORDS, cum_weights=weights, k=n))
+
+
+def render_page(name: str, size: int, seed: int = SEED) -> bytes:
+    rng = random.Random(f"{seed}:{name}")
+    # Zipf-like word frequencies, like natural text
+    total, weights = 0.0, []
+    for rank in range(1, len(WORDS) + 1):
+        total += 1 / rank
+        weights.append(total)
+    topic = rng.choice(TOPICS)
+    head = (
+        "<!doctype html><html lang='en'><head><meta charset='utf-8'>"
+        f"<title>{topic.title()}: the complete {name} guide</title>"
+        f"<meta name='description' content='Learn {topic} step by step with examples, checklists and tools.'>"
+        f"<link rel='canonical' href='https://example.com/{name}'>"
+        "<style>body{font-family:sans-serif}.nav a{margin:0 4px}</style>"
+        "<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments)}</script>"
+        "</head><body><nav class='nav'>"
+        + "".join(f"<a href='/{name}/{i}'>{_words(rng, weights, 2)}</a>" for i in range(20))
+        + f"</nav><main><h1>{topic.title()}</h1>"
+    )
+    parts = [head]
+    written, section = len(head), 0
+    while written < size:
+        section += 1
+        block = [f"<h2>{_words(rng, weights, 4)}</h2>"]
+        for _ in range(rng.randint(2, 6)):
+            block.append(f"<p>{_words(rng, weights, rng.randint(40, 120))} "
+                         f"<a href='/{name}/s{section}'>{topic}</a>.</p>")
+        if section % 5 == 0:
+            block.append("<ul>" + "".join(f"<li>{_words(rng, weights, 6)}</li>" for _ in range(8)) + "</ul>")
+        if section % 7 == 0:
+            block.append(f"<script>var s{section}={{id:{section},tags:['{_words(rng, weights, 3)}']}};</script>")
+        html = "".join(block)
+        parts.append(html)
+        written += len(html)
+    parts.append("</main><footer><p>&copy; Example &amp; Co.</p></footer></body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def build(out: Path = CORPUS_DIR) -> Dict[str, dict]:
+    """Write the corpus to ``out`` (skipping pages already there) and return its manifest."""
+    out.mkdir(parents=True, exist_ok=True)
+    manifest_path = out / "manifest.json"
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+    for name, size in PAGES.items():
+        path = out / f"{name}.html"
+        if name in manifest and path.exists() and path.stat().st_size == manifest[name]["bytes"]:
+            continue
+        body = render_page(name, size)
+        path.write_bytes(body)
+        manifest[name] = {"bytes": len(body), "sha256": hashlib.sha256(body).hexdigest()}
+    manifest = {name: manifest[name] for name in PAGES}
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def corpus_digest(manifest: Dict[str, dict]) -> str:
+    return hashlib.sha256("".join(m["sha256"] for m in manifest.values()).encode()).hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", type=Path, default=CORPUS_DIR)
+    args = parser.parse_args()
+    manifest = build(args.out)
+    for name, m in manifest.items():
+        print(f"{name:<8}{m['bytes']:>12,} bytes  {m['sha256'][:16]}")
+    print(f"corpus {corpus_digest(manifest)}")
+
+
+if __name__ == "__main__":
+    main()
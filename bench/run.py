@@ -0,0 +1,263 @@
+"""Run the benchmark suite and store the results as JSON.
+
+Usage: python -m bench.run [--only micro|endpoints] [--pages tiny,small] [--concurrency 16]
+                           [--requests 200] [--budget 1.0] [--out results.json]
+
+Micro benchmarks time decode, every installed parser backend, the streaming
+analyzer, scoring per plan, keyword extraction, build_audit and PDF render
+on each corpus page. Endpoint benchmarks start the app under uvicorn against
+the local corpus server and drive it with concurrent clients, cold (a new
+URL per request, so nothing is cached) and warm (one URL). Results go to
+bench/results/<time>-<commit>.json; compare two runs with bench.compare.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+sys.path.insert(0, str(ROOT))
+
+from bench.corpus import PAGES, build, corpus_digest  # noqa: E402
+from bench.server import serve  # noqa: E402
+
+MIN_RUNS = 3
+MAX_RUNS = 10000
+# cold endpoint runs download at most this much per scenario and page
+COLD_BYTES_BUDGET = 256 * 1024 * 1024
+STREAM_CHUNK = 64 * 1024
+# (method, path, cold): cold scenarios request a new URL every time
+SCENARIOS = {
+    "analysis_cold": ("GET", "/api/analysis", True),
+    "analysis_warm": ("GET", "/api/analysis", False),
+    "audit_cold": ("GET", "/api/audit", True),
+    "audit_warm": ("GET", "/api/audit", False),
+    "pdf_warm": ("POST", "/api/export/pdf", False),
+}
+
+
+def measure(fn: Callable[[], object], budget: float) -> Dict[str, float]:
+    """Call ``fn`` at least MIN_RUNS times and until ``budget`` seconds have passed."""
+    times: List[float] = []
+    start = time.perf_counter()
+    while len(times) < MIN_RUNS or (time.perf_counter() - start < budget and len(times) < MAX_RUNS):
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return {
+        "runs": len(times),
+        "min_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "mean_ms": round(statistics.fmean(times) * 1000, 4),
+    }
+
+
+async def _chunks(body: bytes):
+    for i in range(0, len(body), STREAM_CHUNK):
+        yield body[i:i + STREAM_CHUNK]
+
+
+def run_micro(corpus: Path, pages: List[str], budget: float) -> Dict[str, dict]:
+    from analysis import build_audit, calculate_score, extract_keywords
+    from df_index import document_frequency
+    from keywords import document_terms
+    from parsers import available_backends, decode_body, get_parser, parse_page
+    from report import render_audit_pdf, warm_up
+    from rules import PLANS
+    from streaming import analyze_stream
+
+    warm_up()
+    bodies = {name: (corpus / f"{name}.html").read_bytes() for name in pages}
+    parsed = {name: parse_page(decode_body(body)) for name, body in bodies.items()}
+    # keyword scores need document frequencies; count the corpus once
+    for page in parsed.values():
+        document_frequency.add_document(document_terms(page.tokens))
+
+    results = {}
+    for name, body in bodies.items():
+        html, page = decode_body(body), parsed[name]
+        audit = build_audit(f"https://example.com/{name}", page)
+        cases = {"decode": lambda: decode_body(body)}
+        for backend in available_backends():
+            cases[f"parse[{backend}]"] = lambda b=get_parser(backend): b.parse(html)
+        cases["stream"] = lambda: asyncio.run(analyze_stream(_chunks(body)))
+        for plan in PLANS:
+            cases[f"score[{plan}]"] = lambda p=plan: calculate_score(page, plan=p)
+        cases["keywords"] = lambda: extract_keywords(page)
+        cases["build_audit"] = lambda: build_audit(f"https://example.com/{name}", page)
+        cases["pdf"] = lambda: render_audit_pdf(audit)
+        for case, fn in cases.items():
+            r = measure(fn, budget)
+            r["mb_s"] = round(len(body) / 1e6 / (r["median_ms"] / 1000), 2) if r["median_ms"] else None
+            results[f"{case}/{name}"] = r
+            print(f"  {case + '/' + name:<32}{r['median_ms']:>12.3f} ms  {r['runs']:>6} runs", flush=True)
+    return results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _drive(app_url: str, method: str, path: str, urls: List[str], concurrency: int) -> dict:
+    import aiohttp
+
+    latencies: List[float] = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(session, url):
+        nonlocal errors
+        async with sem:
+            t = time.perf_counter()
+            try:
+                if method == "GET":
+                    resp = await session.get(app_url + path, params={"url": url})
+                else:
+                    resp = await session.post(app_url + path, json={"url": url})
+                async with resp:
+                    await resp.read()
+                    if resp.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - t)
+
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout, connector=aiohttp.TCPConnector(limit=concurrency)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(session, url) for url in urls))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": len(urls),
+        "concurrency": concurrency,
+        "errors": errors,
+        "rps": round(len(urls) / elapsed, 2),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def _wait_until_up(url: str, proc: subprocess.Popen, timeout: float = 60) -> None:
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("app exited during startup")
+        try:
+            urllib.request.urlopen(url + "/health", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("app did not start")
+
+
+def run_endpoints(corpus: Path, pages: List[str], concurrency: int, requests: int) -> Dict[str, dict]:
+    server, corpus_url = serve(corpus)
+    port = _free_port()
+    app_url = f"http://127.0.0.1:{port}"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_FILE": str(Path(tmp) / "bench.db"),
+            "ANALYTICS_FILE": str(Path(tmp) / "analytics.jsonl"),
+            "DF_INDEX_DIR": str(Path(tmp) / "dfindex"),
+        }
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        try:
+            _wait_until_up(app_url, proc)
+            for scenario, (method, path, cold) in SCENARIOS.items():
+                for name in pages:
+                    page_url = f"{corpus_url}/{name}.html"
+                    if cold:
+                        n = min(requests, max(concurrency, COLD_BYTES_BUDGET // PAGES[name]))
+                        urls = [f"{page_url}?bench={scenario}-{i}" for i in range(n)]
+                    else:
+                        asyncio.run(_drive(app_url, method, path, [page_url], 1))  # prime caches
+                        urls = [page_url] * requests
+                    r = asyncio.run(_drive(app_url, method, path, urls, concurrency))
+                    results[f"{scenario}/{name}"] = r
+                    print(f"  {scenario + '/' + name:<32}{r['rps']:>10.1f} req/s  p50 {r['p50_ms']:>9.1f} ms  "
+                          f"p99 {r['p99_ms']:>9.1f} ms  {r['errors']} errors", flush=True)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+            server.shutdown()
+    return results
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", choices=("micro", "endpoints"))
+    parser.add_argument("--pages", default=",".join(PAGES), help="comma-separated corpus pages")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per micro benchmark")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint scenario and page")
+    parser.add_argument("--out", type=Path)
+    args = parser.parse_args()
+    pages = [p for p in args.pages.split(",") if p]
+    unknown = set(pages) - set(PAGES)
+    if unknown:
+        parser.error(f"unknown pages: {', '.join(sorted(unknown))}")
+
+    # micro benchmarks keep document frequencies in memory
+    os.environ["DF_INDEX_DIR"] = ""
+    manifest = build()
+    corpus = Path(__file__).resolve().parent / "corpus"
+    commit = _git("rev-parse", "--short", "HEAD")
+    results = {
+        "meta": {
+            "commit": commit,
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "corpus": corpus_digest(manifest),
+            "pages": pages,
+        },
+    }
+    if args.only in (None, "micro"):
+        print("micro benchmarks (median per call)")
+        results["micro"] = run_micro(corpus, pages, args.budget)
+    if args.only in (None, "endpoints"):
+        print(f"endpoint benchmarks ({args.concurrency} concurrent clients)")
+        results["endpoints"] = run_endpoints(corpus, pages, args.concurrency, args.requests)
+
+    out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2))
+    print(f"wrote {out}")
+
+
+if __name__ == "__main__":
+    main()
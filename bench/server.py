@@ -0,0 +1,57 @@
+"""Local stand-in HTTP server for the benchmark corpus.
+
+Usage: python -m bench.server [--port 8765] [--dir bench/corpus]
+
+Serves the corpus with Last-Modified and 304 support, like a static site,
+so endpoint benchmarks never leave the machine.
+"""
+import argparse
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Tuple
+
+from bench.corpus import CORPUS_DIR, build
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like a real server
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CorpusServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients that time out and hang up mid-body are expected under load
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(directory: Path = CORPUS_DIR, port: int = 0) -> Tuple[ThreadingHTTPServer, str]:
+    """Serve ``directory`` from a daemon thread; returns the server and its base URL."""
+    server = CorpusServer(("127.0.0.1", port), partial(QuietHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--dir", type=Path, default=CORPUS_DIR)
+    args = parser.parse_args()
+    build(args.dir)
+    server, base = serve(args.dir, args.port)
+    print(f"serving {args.dir} at {base}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""TTL + LRU cache for parsed pages, keyed by normalized URL.
+
+Entries outlive their TTL for CACHE_STALE_SECONDS so that an expired page can
+be revalidated with If-None-Match / If-Modified-Since instead of re-downloaded
+and re-parsed. The in-memory cache is bounded by CACHE_MAX_ENTRIES and by an
+estimate of the pages' size in CACHE_MAX_BYTES, since one streamed page can
+hold millions of tokens. Set CACHE_REDIS_URL to share entries between workers.
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from analysis import PageModel
+
+CACHE_TTL = float(os.getenv("CACHE_TTL", "60"))
+CACHE_STALE_SECONDS = float(os.getenv("CACHE_STALE_SECONDS", "3600"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+STR_OVERHEAD = 57  # CPython str header plus the list slot pointing at it
+
+
+def normalize_url(url: str) -> str:
+    """Canonical cache key: lowercase scheme/host, no default port, sorted query, no fragment."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+def site_host(url: str) -> str:
+    """The site a URL belongs to: its lowercase host without a leading www."""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    page: PageModel
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    expires_at: float = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return self.expires_at > time.time()
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw) -> "CacheEntry":
+        data = json.loads(raw)
+        data["page"] = PageModel(**data["page"])
+        return cls(**data)
+
+
+def page_size(page: PageModel) -> int:
+    """Rough number of bytes ``page`` keeps alive, dominated by its text and tokens or term counts."""
+    strings = [page.title, page.meta_description or "", page.robots or "", page.canonical or "", page.text]
+    strings += page.links
+    for texts in page.headings.values():
+        strings += texts
+    terms = page.term_counts or {}
+    n = len(strings) + len(page.tokens) + 2 * len(terms)
+    return sum(map(len, strings)) + sum(map(len, page.tokens)) + sum(map(len, terms)) + STR_OVERHEAD * n
+
+
+class CacheBackend:
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raise NotImplementedError
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """LRU over at most ``max_entries`` entries and ``max_bytes`` of estimated page size.
+
+    A page larger than the whole byte budget is not cached.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pop(self, key: str) -> None:
+        self._entries.pop(key, None)
+        self.bytes -= self._sizes.pop(key, 0)
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at + CACHE_STALE_SECONDS < time.time():
+            self._pop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        old = self._entries.get(key)
+        size = self._sizes[key] if old is not None and old.page is entry.page else page_size(entry.page)
+        self._pop(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = entry
+        self._sizes[key] = size
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._pop(next(iter(self._entries)))
+
+    async def delete(self, key: str) -> None:
+        self._pop(key)
+
+
+class RedisCache(CacheBackend):
+    """Redis-compatible store; LRU eviction comes from the server's maxmemory policy.
+
+    Entries are stored as JSON, never pickled, so whoever can write to the
+    server cannot make workers run code.
+    """
+
+    def __init__(self, url: str, prefix: str = "rp:page:"):
+        import redis.asyncio
+        self.client = redis.asyncio.from_url(url)
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[CacheEntry]:
+        raw = await self.client.get(self.prefix + key)
+        return CacheEntry.from_json(raw) if raw else None
+
+    async def set(self, key: str, entry: CacheEntry) -> None:
+        ttl = max(1, int(entry.expires_at - time.time() + CACHE_STALE_SECONDS))
+        await self.client.set(self.prefix + key, entry.to_json(), ex=ttl)
+
+    async def delete(self, key: str) -> None:
+        await self.client.delete(self.prefix + key)
+
+
+def make_cache() -> CacheBackend:
+    if CACHE_REDIS_URL:
+        return RedisCache(CACHE_REDIS_URL)
+    return MemoryCache()
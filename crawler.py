@@ -0,0 +1,340 @@
+"""Whole-site crawler built on the shared fetch/parse pipeline and scoring.
+
+A crawl starts from a root URL plus the site's sitemap URLs (from robots.txt
+or /sitemap.xml), follows same-host links breadth-first within a depth and
+page budget, honours robots.txt rules and crawl-delay, and saves its state
+to CRAWL_STATE_DIR so an interrupted crawl can be resumed. Crawlers that
+stopped running are dropped from memory after CRAWL_RETENTION_SECONDS; their
+state stays on disk.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+import xml.etree.ElementTree as ET
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urldefrag, urljoin, urlsplit
+from urllib.robotparser import RobotFileParser
+
+from analysis import calculate_score
+from cache import normalize_url, site_host
+from fetcher import FetchError, fetch_page
+from pipeline import load_page
+
+CRAWL_STATE_DIR = Path(os.getenv("CRAWL_STATE_DIR", ".crawls"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "500"))
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "5"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "4"))
+CRAWL_DELAY = float(os.getenv("CRAWL_DELAY", "0.25"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "RankyPulseBot")
+CRAWL_RETENTION_SECONDS = float(os.getenv("CRAWL_RETENTION_SECONDS", "3600"))
+SAVE_EVERY = 25
+MAX_SITEMAPS = 20
+
+SKIP_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".ico", ".pdf", ".zip",
+    ".gz", ".mp3", ".mp4", ".avi", ".mov", ".css", ".js", ".json", ".xml", ".woff", ".woff2",
+)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CrawlState:
+    id: str
+    root: str
+    max_pages: int = CRAWL_MAX_PAGES
+    max_depth: int = CRAWL_MAX_DEPTH
+    status: str = "queued"
+    frontier: List[Tuple[str, int]] = field(default_factory=list)
+    seen: List[str] = field(default_factory=list)
+    pages: List[dict] = field(default_factory=list)
+    errors: int = 0
+    started_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    @property
+    def path(self) -> Path:
+        return CRAWL_STATE_DIR / f"{self.id}.json"
+
+    def save(self) -> None:
+        CRAWL_STATE_DIR.mkdir(parents=True, exist_ok=True)
+        self.updated_at = time.time()
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(self)))
+        os.replace(tmp, self.path)
+
+    @classmethod
+    def load(cls, crawl_id: str) -> Optional["CrawlState"]:
+        path = CRAWL_STATE_DIR / f"{Path(crawl_id).name}.json"
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        data["frontier"] = [tuple(item) for item in data["frontier"]]
+        return cls(**data)
+
+    def progress(self) -> dict:
+        issue_counts = Counter(k for p in self.pages for k in p.get("issues", []))
+        scores = [p["score"] for p in self.pages if "score" in p]
+        return {
+            "id": self.id,
+            "root": self.root,
+            "status": self.status,
+            "pages_crawled": len(self.pages),
+            "pages_queued": len(self.frontier),
+            "max_pages": self.max_pages,
+            "max_depth": self.max_depth,
+            "errors": self.errors,
+            "avg_score": round(sum(scores) / len(scores), 1) if scores else None,
+            "issue_counts": dict(issue_counts.most_common()),
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class HostThrottle:
+    """Space requests to the same host at least ``delay`` seconds apart."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self._next: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    async def wait(self, host: str) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._locks.setdefault(host, asyncio.Lock()):
+            pause = self._next.get(host, 0.0) - loop.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            self._next[host] = loop.time() + self.delay
+
+
+class Crawler:
+    def __init__(self, state: CrawlState):
+        self.state = state
+        self.host = site_host(state.root)
+        self.robots = RobotFileParser()
+        self.robots.allow_all = True
+        self.throttle = HostThrottle(CRAWL_DELAY)
+        self.queue: "asyncio.Queue[Tuple[str, int]]" = asyncio.Queue()
+        # everything queued or in progress; saved as the frontier for resuming
+        self.pending = {normalize_url(url): (url, depth) for url, depth in state.frontier}
+        self.seen = set(state.seen)
+        self.task: Optional[asyncio.Task] = None
+
+    def _allowed(self, url: str) -> bool:
+        parts = urlsplit(url)
+        return (
+            parts.scheme in ("http", "https")
+            and site_host(url) == self.host
+            and not parts.path.lower().endswith(SKIP_EXTENSIONS)
+            and self.robots.can_fetch(CRAWL_USER_AGENT, url)
+        )
+
+    def _enqueue(self, url: str, depth: int) -> None:
+        url = urldefrag(url)[0]
+        key = normalize_url(url)
+        if key in self.seen or depth > self.state.max_depth or not self._allowed(url):
+            return
+        if len(self.seen) >= self.state.max_pages:
+            return
+        self.seen.add(key)
+        self.pending[key] = (url, depth)
+        self.queue.put_nowait((url, depth))
+
+    async def _get_text(self, url: str) -> Optional[str]:
+        try:
+            r = await fetch_page(url, headers={"User-Agent": CRAWL_USER_AGENT})
+        except FetchError:
+            return None
+        return r.text if r.status == 200 else None
+
+    async def _load_robots(self) -> List[str]:
+        robots_url = urljoin(self.state.root, "/robots.txt")
+        text = await self._get_text(robots_url)
+        if text is None:
+            return []
+        self.robots = RobotFileParser(robots_url)
+        self.robots.parse(text.splitlines())
+        delay = self.robots.crawl_delay(CRAWL_USER_AGENT)
+        if delay:
+            self.throttle.delay = max(self.throttle.delay, float(delay))
+        return list(self.robots.site_maps() or [])
+
+    async def _sitemap_urls(self, sitemaps: List[str]) -> List[str]:
+        """Page URLs from the given sitemaps, following sitemap indexes."""
+        todo, urls, fetched = list(sitemaps), [], 0
+        while todo and fetched < MAX_SITEMAPS and len(urls) < self.state.max_pages:
+            text = await self._get_text(todo.pop(0))
+            fetched += 1
+            if not text:
+                continue
+            try:
+                root = ET.fromstring(text.strip().encode("utf-8"))
+            except ET.ParseError:
+                continue
+            locs = [el.text.strip() for el in root.iter() if el.tag.endswith("loc") and el.text]
+            if root.tag.endswith("sitemapindex"):
+                todo.extend(locs)
+            else:
+                urls.extend(locs)
+        return urls
+
+    async def _seed(self) -> None:
+        sitemaps = await self._load_robots()
+        if self.pending or self.state.pages:
+            # resuming: re-queue everything that was pending when we stopped
+            for item in self.pending.values():
+                self.queue.put_nowait(item)
+            return
+        self._enqueue(self.state.root, 0)
+        for url in await self._sitemap_urls(sitemaps or [urljoin(self.state.root, "/sitemap.xml")]):
+            self._enqueue(url, 0)
+
+    async def _visit(self, url: str, depth: int) -> None:
+        await self.throttle.wait(self.host)
+        try:
+            page = await load_page(url, headers={"User-Agent": CRAWL_USER_AGENT}, raise_for_status=True)
+        except Exception as e:
+            self.state.errors += 1
+            self.state.pages.append({"url": url, "depth": depth, "error": str(e)})
+            return
+        score, issues = calculate_score(page)
+        self.state.pages.append({
+            "url": url,
+            "depth": depth,
+            "score": score,
+            "title": page.title,
+            "word_count": page.word_count,
+            "issues": [i["code"] for i in issues],
+        })
+        for href in page.links:
+            self._enqueue(urljoin(url, href), depth + 1)
+
+    async def _worker(self) -> None:
+        while True:
+            url, depth = await self.queue.get()
+            try:
+                # a cancelled visit stays pending so a resumed crawl retries it
+                try:
+                    await self._visit(url, depth)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.exception("crawl %s failed to visit %s", self.state.id, url)
+                    self.state.errors += 1
+                    self.state.pages.append({"url": url, "depth": depth, "error": str(e) or e.__class__.__name__})
+                self.pending.pop(normalize_url(url), None)
+                if len(self.state.pages) % SAVE_EVERY == 0:
+                    self._save()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("crawl %s could not save its state", self.state.id)
+            finally:
+                # queue.join() in run() waits for every item, whatever happened to it
+                self.queue.task_done()
+
+    def progress(self) -> dict:
+        self.state.frontier = list(self.pending.values())
+        return self.state.progress()
+
+    def _save(self) -> None:
+        self.state.frontier = list(self.pending.values())
+        self.state.seen = sorted(self.seen)
+        self.state.save()
+
+    async def run(self) -> None:
+        self.state.status = "running"
+        workers = []
+        try:
+            await self._seed()
+            self._save()
+            workers = [asyncio.ensure_future(self._worker()) for _ in range(CRAWL_CONCURRENCY)]
+            await self.queue.join()
+            self.state.status = "done"
+        except asyncio.CancelledError:
+            self.state.status = "paused"
+            raise
+        except Exception:
+            self.state.status = "failed"
+            raise
+        finally:
+            for w in workers:
+                w.cancel()
+            self._save()
+
+    def start(self) -> asyncio.Task:
+        self.state.status = "running"
+        self.task = asyncio.ensure_future(self.run())
+        return self.task
+
+
+crawls: Dict[str, Crawler] = {}
+
+
+def _running(crawler: Optional[Crawler]) -> bool:
+    return crawler is not None and crawler.task is not None and not crawler.task.done()
+
+
+def _evict_stopped(now: Optional[float] = None) -> None:
+    """Forget crawlers that stopped over CRAWL_RETENTION_SECONDS ago; they reload from disk."""
+    cutoff = (now or time.time()) - CRAWL_RETENTION_SECONDS
+    for crawl_id, crawler in list(crawls.items()):
+        if not _running(crawler) and crawler.state.updated_at < cutoff:
+            del crawls[crawl_id]
+
+
+def start_crawl(root: str, max_pages: int = CRAWL_MAX_PAGES, max_depth: int = CRAWL_MAX_DEPTH) -> dict:
+    _evict_stopped()
+    state = CrawlState(id=uuid.uuid4().hex, root=root, max_pages=max_pages, max_depth=max_depth)
+    crawler = crawls[state.id] = Crawler(state)
+    crawler.start()
+    return crawler.progress()
+
+
+def get_crawl(crawl_id: str) -> Optional[CrawlState]:
+    _evict_stopped()
+    crawler = crawls.get(crawl_id)
+    return crawler.state if crawler is not None else CrawlState.load(crawl_id)
+
+
+def crawl_progress(crawl_id: str) -> Optional[dict]:
+    _evict_stopped()
+    crawler = crawls.get(crawl_id)
+    if crawler is not None:
+        return crawler.progress()
+    state = CrawlState.load(crawl_id)
+    return state.progress() if state is not None else None
+
+
+def resume_crawl(crawl_id: str) -> Optional[dict]:
+    crawler = crawls.get(crawl_id)
+    if not _running(crawler):
+        state = CrawlState.load(crawl_id)
+        if state is None:
+            return None
+        crawler = crawls[state.id] = Crawler(state)
+        crawler.start()
+    return crawler.progress()
+
+
+async def pause_crawl(crawl_id: str) -> Optional[dict]:
+    crawler = crawls.get(crawl_id)
+    if crawler is None:
+        return crawl_progress(crawl_id)
+    if _running(crawler):
+        crawler.task.cancel()
+        await asyncio.gather(crawler.task, return_exceptions=True)
+    return crawler.progress()
+
+
+async def pause_all() -> None:
+    for crawl_id, crawler in list(crawls.items()):
+        if _running(crawler):
+            await pause_crawl(crawl_id)
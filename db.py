@@ -1,13 +1,120 @@
+"""SQLite database: models, tuned sync/async engines and batch insert helpers.
+
+Every connection gets WAL journaling, a busy timeout and the other DB_*
+pragmas, so several uvicorn workers can read while one writes and writers
+wait for the lock instead of failing with "database is locked".
+"""
+import os
+from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import TYPE_CHECKING, AsyncIterator, Iterable, Optional
 
+from sqlalchemy import Index, event, insert
 from sqlmodel import SQLModel, Field, create_engine, Session
 
+if TYPE_CHECKING:
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
 # SQLite database file
-sqlite_file_name = "database.db"
+sqlite_file_name = os.getenv("DATABASE_FILE", "database.db")
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
-engine = create_engine(sqlite_url, echo=False)
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")  # NORMAL is safe with WAL
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "10000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "8"))
+DB_BATCH_SIZE = int(os.getenv("DB_BATCH_SIZE", "1000"))
+
+
+def _set_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+engine = create_engine(
+    sqlite_url,
+    echo=False,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    # handlers hand sessions to worker threads; sqlite3's own timeout backs up busy_timeout
+    connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+)
+event.listen(engine, "connect", _set_pragmas)
+
+_async_engine = None
+_async_sessions = None
+
+
+def get_async_engine():
+    """The aiosqlite engine, created on first use with the same pragmas and pool settings."""
+    global _async_engine, _async_sessions
+    if _async_engine is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+        from sqlmodel.ext.asyncio.session import AsyncSession
+
+        _async_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{sqlite_file_name}",
+            echo=False,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            connect_args={"timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        )
+        event.listen(_async_engine.sync_engine, "connect", _set_pragmas)
+        _async_sessions = async_sessionmaker(_async_engine, class_=AsyncSession, expire_on_commit=False)
+    return _async_engine
+
+
+@asynccontextmanager
+async def async_session() -> AsyncIterator["AsyncSession"]:
+    """``async with async_session() as session:`` for use in ``async def`` handlers."""
+    get_async_engine()
+    async with _async_sessions() as session:
+        yield session
+
+
+async def dispose_async_engine() -> None:
+    global _async_engine, _async_sessions
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = _async_sessions = None
+
+
+def bulk_insert(model, rows: Iterable[dict], batch_size: int = DB_BATCH_SIZE) -> int:
+    """Insert ``rows`` into ``model``'s table with executemany, one transaction for all batches."""
+    table = getattr(model, "__table__", model)
+    stmt = insert(table)
+    total, batch = 0, []
+    with engine.begin() as conn:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                conn.execute(stmt, batch)
+                total, batch = total + len(batch), []
+        if batch:
+            conn.execute(stmt, batch)
+            total += len(batch)
+    return total
+
+
+async def bulk_insert_async(model, rows: Iterable[dict], batch_size: int = DB_BATCH_SIZE) -> int:
+    """bulk_insert through the async engine."""
+    table = getattr(model, "__table__", model)
+    stmt = insert(table)
+    rows = list(rows)
+    async with get_async_engine().begin() as conn:
+        for i in range(0, len(rows), batch_size):
+            await conn.execute(stmt, rows[i:i + batch_size])
+    return len(rows)
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -23,6 +130,101 @@ class OptimizationLog(SQLModel, table=True):
     content_length: int
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class Job(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    kind: str
+    status: str = Field(default="queued", index=True)
+    params: str = "{}"
+    result: Optional[bytes] = None
+    media_type: Optional[str] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = Field(default=None, index=True)
+    owner: Optional[str] = None  # JobQueue.owner of the process that queued the job
+    lease_until: Optional[datetime] = Field(default=None, index=True)
+
+class AnalyticsEvent(SQLModel, table=True):
+    __table_args__ = (Index("ix_analyticsevent_et_ts", "et", "ts"),)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    ts: int = Field(index=True)
+    et: str
+    data: str = "{}"
+
+class AnalyticsCounter(SQLModel, table=True):
+    et: str = Field(primary_key=True)
+    bucket: int = Field(primary_key=True)  # start of the hour, epoch seconds
+    count: int = 0
+
+class AuditState(SQLModel, table=True):
+    """Last audit of a URL, with the validators to re-audit it conditionally."""
+    url: str = Field(primary_key=True)  # normalized, see cache.normalize_url
+    plan: str = "free"
+    content_hash: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    result: str = "{}"  # build_audit payload as JSON
+    audited_at: datetime = Field(default_factory=datetime.utcnow)
+    checked_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Schedule(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    url: str
+    user_id: Optional[int] = Field(default=None, index=True)
+    plan: str = "free"
+    interval_seconds: int = 7 * 24 * 3600
+    enabled: bool = True
+    next_run_at: datetime = Field(index=True)
+    last_run_at: Optional[datetime] = None
+    last_status: Optional[str] = None  # done, skipped (page unchanged) or failed
+    last_score: Optional[int] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class HistorySite(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    host: str = Field(unique=True)
+
+class HistoryUrl(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    url: str = Field(unique=True)  # normalized, see cache.normalize_url
+    site_id: int
+
+class HistoryKeyword(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    term: str = Field(unique=True)
+
+class AuditRecord(SQLModel, table=True):
+    """One row per audit, with every text value replaced by an integer id or bit."""
+    __table_args__ = (
+        Index("ix_auditrecord_url_ts", "url_id", "ts"),
+        Index("ix_auditrecord_site_ts", "site_id", "ts"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    url_id: int
+    site_id: int
+    ts: int  # epoch seconds
+    score: int
+    issue_mask: int  # bits from history.ISSUE_CODES
+    keyword_ids: bytes = b""  # uint32 HistoryKeyword ids, in rank order
+    duration_ms: int = 0
+    skipped: bool = False  # page unchanged, stored audit reused
+
+class AuditDaily(SQLModel, table=True):
+    """Per-site daily score rollup, updated as records are written."""
+    site_id: int = Field(primary_key=True)
+    day: int = Field(primary_key=True, index=True)  # start of the UTC day, epoch seconds
+    audits: int = 0
+    score_sum: int = 0
+    score_min: int = 100
+    score_max: int = 0
+
+class AuditIssueDaily(SQLModel, table=True):
+    site_id: int = Field(primary_key=True)
+    day: int = Field(primary_key=True, index=True)
+    issue: int = Field(primary_key=True)  # bit from history.ISSUE_CODES
+    count: int = 0
+
 def create_db_and_tables() -> None:
     SQLModel.metadata.create_all(engine)
 
@@ -0,0 +1,391 @@
+"""Document-frequency tables for TF-IDF keyword scoring.
+
+The default table is an on-disk index in DF_INDEX_DIR shared by every process
+that scores keywords (API workers and stage executor workers):
+
+* ``df.idx`` - compacted base: a header, then term hashes (sorted uint64) and
+  their document counts (uint32) as two flat arrays. It is memory-mapped, so
+  processes share the page cache instead of each loading a copy, and a lookup
+  is a binary search over the mapped hashes.
+* ``df.<generation>.log`` - documents added since the last compaction, one
+  record per document (term count + term hashes), appended with single writes.
+  A record with REMOVED set in its count takes a document back out. Every
+  process tails it into a small in-memory delta.
+* ``df.docs`` - SQLite table of the term hashes last counted for each
+  document id (a normalized URL) and the content version they came from, so
+  ``set_document`` counts a document once and replaces it when it changes.
+
+Compaction merges a snapshot of the base and log into a new base file without
+holding any lock, then swaps it in with os.replace under a short exclusive
+``df.lock``; other processes notice the new file and re-map.
+Set DF_INDEX_DIR to an empty string to keep the table in memory instead.
+
+    python df_index.py stats|compact
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+DF_INDEX_DIR = os.getenv("DF_INDEX_DIR", ".dfindex")
+# fold the log into the base once it holds this many bytes
+DF_COMPACT_BYTES = int(os.getenv("DF_COMPACT_BYTES", str(4 * 1024 * 1024)))
+
+MAGIC = b"DFIDX001"
+HEADER = struct.Struct("<8sQQQ")  # magic, generation, n_docs, n_terms
+COUNT = struct.Struct("<I")
+REMOVED = 1 << 31  # flag in a record's count: subtract the record's terms
+HASH_SIZE = 8
+DF_SIZE = 4
+
+if sys.byteorder != "little":  # pragma: no cover
+    raise ImportError("df_index maps little-endian arrays directly")
+
+
+def term_hash(term: str) -> int:
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=HASH_SIZE).digest(), "little")
+
+
+class DocumentFrequency:
+    """How many audited documents contain each term."""
+
+    n_docs = 0
+
+    def df(self, term: str) -> int:
+        return self.df_many([term])[0]
+
+    def df_many(self, terms: List[str]) -> List[int]:
+        raise NotImplementedError
+
+    def add_document(self, terms: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def set_document(self, doc_id: str, version: str, terms: Iterable[str]) -> bool:
+        """Count ``doc_id`` once; a new ``version`` replaces its previous terms.
+
+        Returns False when this version of the document is already counted.
+        """
+        raise NotImplementedError
+
+    def needs_compaction(self) -> bool:
+        return False
+
+    def compact(self) -> None:
+        pass
+
+
+class MemoryDocumentFrequency(DocumentFrequency):
+    def __init__(self):
+        self.n_docs = 0
+        self._df: Counter = Counter()
+        self._docs: Dict[str, Tuple[str, FrozenSet[str]]] = {}
+
+    def df_many(self, terms: List[str]) -> List[int]:
+        return [self._df.get(t, 0) for t in terms]
+
+    def add_document(self, terms: Iterable[str]) -> None:
+        self.n_docs += 1
+        self._df.update(set(terms))
+
+    def set_document(self, doc_id: str, version: str, terms: Iterable[str]) -> bool:
+        old = self._docs.get(doc_id)
+        if old is not None and old[0] == version:
+            return False
+        terms = frozenset(terms)
+        if old is not None:
+            self.n_docs -= 1
+            self._df.subtract(old[1])
+        self.add_document(terms)
+        self._docs[doc_id] = (version, terms)
+        return True
+
+
+class DiskDocumentFrequency(DocumentFrequency):
+    """The memory-mapped index in ``directory``; opened lazily on first use."""
+
+    def __init__(self, directory: str, compact_bytes: int = DF_COMPACT_BYTES):
+        self.directory = Path(directory)
+        self.base_path = self.directory / "df.idx"
+        self.compact_bytes = compact_bytes
+        self._lock = threading.RLock()
+        self._lock_fd: Optional[int] = None
+        self._base_id = None
+        self._mm: Optional[mmap.mmap] = None
+        self._hashes: Optional[memoryview] = None
+        self._dfs: Optional[memoryview] = None
+        self._generation = 0
+        self._base_docs = 0
+        self._log_fd: Optional[int] = None
+        self._log_offset = 0
+        self._delta: Counter = Counter()
+        self._delta_docs = 0
+        self._docs_lock = threading.Lock()
+        self._docs: Optional[sqlite3.Connection] = None
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"df.{generation}.log"
+
+    def _flock(self, op: int) -> None:
+        if self._lock_fd is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._lock_fd = os.open(self.directory / "df.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._lock_fd, op)
+
+    def _release(self) -> None:
+        for view in (self._hashes, self._dfs):
+            if view is not None:
+                view.release()
+        self._hashes = self._dfs = None
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._log_fd is not None:
+            os.close(self._log_fd)
+            self._log_fd = None
+
+    def _map_base(self) -> None:
+        """(Re)map the base file if it was replaced since we last looked."""
+        try:
+            st = os.stat(self.base_path)
+        except FileNotFoundError:
+            self._write_base(0, 0, array("Q"), array("I"))
+            st = os.stat(self.base_path)
+        if (st.st_ino, st.st_mtime_ns) == self._base_id:
+            return
+        self._release()
+        with open(self.base_path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, generation, n_docs, n_terms = HEADER.unpack_from(self._mm)
+        if magic != MAGIC:
+            raise ValueError(f"Not a document-frequency index: {self.base_path}")
+        view = memoryview(self._mm)
+        start = HEADER.size
+        self._hashes = view[start:start + n_terms * HASH_SIZE].cast("Q")
+        start += n_terms * HASH_SIZE
+        self._dfs = view[start:start + n_terms * DF_SIZE].cast("I")
+        view.release()
+        self._base_id = (st.st_ino, st.st_mtime_ns)
+        self._generation, self._base_docs = generation, n_docs
+        self._log_fd = os.open(self._log_path(generation), os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        self._log_offset, self._delta, self._delta_docs = 0, Counter(), 0
+
+    def _tail_log(self) -> None:
+        """Read complete records appended to the log since the last call."""
+        size = os.fstat(self._log_fd).st_size
+        if size <= self._log_offset:
+            return
+        data = os.pread(self._log_fd, size - self._log_offset, self._log_offset)
+        pos = 0
+        while pos + COUNT.size <= len(data):
+            (n,) = COUNT.unpack_from(data, pos)
+            removed, n = n & REMOVED, n & ~REMOVED
+            end = pos + COUNT.size + n * HASH_SIZE
+            if end > len(data):
+                break  # a record still being written
+            hashes = memoryview(data)[pos + COUNT.size:end].cast("Q").tolist()
+            if removed:
+                self._delta.subtract(hashes)
+                self._delta_docs -= 1
+            else:
+                self._delta.update(hashes)
+                self._delta_docs += 1
+            pos = end
+        self._log_offset += pos
+
+    def _refresh(self) -> None:
+        self._map_base()
+        self._tail_log()
+
+    @property
+    def n_docs(self) -> int:
+        with self._lock:
+            self._refresh()
+            return self._base_docs + self._delta_docs
+
+    def _lookup(self, h: int) -> int:
+        i = bisect_left(self._hashes, h)
+        base = self._dfs[i] if i < len(self._hashes) and self._hashes[i] == h else 0
+        return base + self._delta.get(h, 0)
+
+    def df_many(self, terms: List[str]) -> List[int]:
+        with self._lock:
+            self._refresh()
+            return [self._lookup(term_hash(t)) for t in terms]
+
+    def _append(self, records: bytes) -> None:
+        with self._lock:
+            self._flock(fcntl.LOCK_SH)
+            try:
+                # compaction may have started a new generation; append to its log
+                self._map_base()
+                os.write(self._log_fd, records)
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def add_document(self, terms: Iterable[str]) -> None:
+        hashes = array("Q", sorted({term_hash(t) for t in terms}))
+        self._append(COUNT.pack(len(hashes)) + hashes.tobytes())
+
+    def _docs_db(self) -> sqlite3.Connection:
+        if self._docs is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._docs = sqlite3.connect(
+                self.directory / "df.docs", timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._docs.execute("PRAGMA journal_mode=WAL")
+            self._docs.execute(
+                "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, version TEXT NOT NULL, terms BLOB NOT NULL)"
+            )
+        return self._docs
+
+    def set_document(self, doc_id: str, version: str, terms: Iterable[str]) -> bool:
+        hashes = array("Q", sorted({term_hash(t) for t in terms})).tobytes()
+        with self._docs_lock:
+            db = self._docs_db()
+            # IMMEDIATE serializes processes replacing documents, so each old version is removed once
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT version, terms FROM docs WHERE id = ?", (doc_id,)).fetchone()
+                if row is not None and row[0] == version:
+                    db.execute("ROLLBACK")
+                    return False
+                records = b""
+                if row is not None:
+                    records += COUNT.pack(len(row[1]) // HASH_SIZE | REMOVED) + row[1]
+                records += COUNT.pack(len(hashes) // HASH_SIZE) + hashes
+                self._append(records)
+                db.execute("INSERT OR REPLACE INTO docs (id, version, terms) VALUES (?, ?, ?)", (doc_id, version, hashes))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return True
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            self._map_base()
+            return os.fstat(self._log_fd).st_size >= self.compact_bytes
+
+    def _write_base_file(self, path: Path, generation: int, n_docs: int, hashes: array, dfs: array) -> None:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, generation, n_docs, len(hashes)))
+            hashes.tofile(f)
+            dfs.tofile(f)
+
+    def _write_base(self, generation: int, n_docs: int, hashes: array, dfs: array) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self.base_path.with_name(f"df.idx.{os.getpid()}.tmp")
+        self._write_base_file(tmp, generation, n_docs, hashes, dfs)
+        os.replace(tmp, self.base_path)
+
+    def _snapshot(self):
+        """Copy the base arrays and the delta, with the log offset they cover."""
+        with self._lock:
+            self._flock(fcntl.LOCK_SH)
+            try:
+                self._refresh()
+                hashes, dfs = array("Q"), array("I")
+                hashes.frombytes(self._hashes.cast("B"))
+                dfs.frombytes(self._dfs.cast("B"))
+                return (
+                    self._generation, self._base_docs + self._delta_docs, self._log_offset,
+                    hashes, dfs, Counter(self._delta),
+                )
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def compact(self) -> None:
+        """Fold the log into a new base file and start a fresh log.
+
+        The merge runs on a snapshot with no lock held; only the final swap
+        takes the exclusive lock, copying over records appended meanwhile.
+        """
+        generation, n_docs, offset, hashes, dfs, delta = self._snapshot()
+        if not delta:
+            return
+        hashes, dfs = merge_counts(hashes, dfs, delta)
+        tmp = self.base_path.with_name(f"df.idx.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._write_base_file(tmp, generation + 1, n_docs, hashes, dfs)
+        del hashes, dfs
+        with self._lock:
+            self._flock(fcntl.LOCK_EX)
+            try:
+                self._map_base()
+                if self._generation != generation:
+                    # another process compacted first
+                    tmp.unlink(missing_ok=True)
+                    return
+                old_log = self._log_path(generation)
+                size = os.fstat(self._log_fd).st_size
+                late = os.pread(self._log_fd, size - offset, offset) if size > offset else b""
+                # records appended during the merge carry over to the new log
+                with open(self._log_path(generation + 1), "wb") as f:
+                    f.write(late)
+                os.replace(tmp, self.base_path)
+                old_log.unlink(missing_ok=True)
+                self._map_base()
+            finally:
+                self._flock(fcntl.LOCK_UN)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "path": str(self.base_path),
+                "generation": self._generation,
+                "n_docs": self._base_docs + self._delta_docs,
+                "base_terms": len(self._hashes),
+                "delta_docs": self._delta_docs,
+                "delta_terms": len(self._delta),
+                "log_bytes": self._log_offset,
+            }
+
+
+def merge_counts(hashes: array, dfs: array, delta: Counter):
+    """Add ``delta`` (hash -> count) to the sorted ``hashes``/``dfs`` arrays."""
+    new = []
+    for h, n in delta.items():
+        i = bisect_left(hashes, h)
+        if i < len(hashes) and hashes[i] == h:
+            dfs[i] = max(0, dfs[i] + n)
+        elif n > 0:
+            new.append((h, n))
+    if not new:
+        return hashes, dfs
+    new.sort()
+    out_hashes, out_dfs = array("Q"), array("I")
+    start = 0
+    for h, n in new:
+        i = bisect_left(hashes, h, start)
+        out_hashes.extend(hashes[start:i])
+        out_dfs.extend(dfs[start:i])
+        out_hashes.append(h)
+        out_dfs.append(n)
+        start = i
+    out_hashes.extend(hashes[start:])
+    out_dfs.extend(dfs[start:])
+    return out_hashes, out_dfs
+
+
+def open_document_frequency(directory: str = DF_INDEX_DIR) -> DocumentFrequency:
+    return DiskDocumentFrequency(directory) if directory else MemoryDocumentFrequency()
+
+
+document_frequency = open_document_frequency()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ("stats", "compact") or not DF_INDEX_DIR:
+        sys.exit("usage: python df_index.py stats|compact  (with DF_INDEX_DIR set)")
+    if sys.argv[1] == "compact":
+        document_frequency.compact()
+    print(document_frequency.stats())
@@ -0,0 +1,129 @@
+"""Run CPU-bound pipeline stages (parse, audit build, PDF render) off the event loop.
+
+EXECUTOR_KIND selects where stages run: ``process`` (default on GIL builds),
+``thread`` (default on free-threaded builds) or ``inline``. Only bytes and
+compact results cross the process boundary. A process pool broken by a dying
+worker (e.g. OOM-killed on a huge parse) is replaced, and the calls it took
+down are retried once on the new pool.
+"""
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, TypeVar
+
+import metrics
+
+T = TypeVar("T")
+
+GIL_ENABLED = getattr(sys, "_is_gil_enabled", lambda: True)()
+EXECUTOR_KIND = os.getenv("EXECUTOR_KIND", "process" if GIL_ENABLED else "thread")
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(os.cpu_count() or 2)))
+# bodies smaller than this parse faster inline than the round trip to a worker costs
+EXECUTOR_INLINE_BYTES = int(os.getenv("EXECUTOR_INLINE_BYTES", str(32 * 1024)))
+
+
+def _timed(fn: Callable[..., T], *args) -> "tuple[T, float, float]":
+    start = time.time()
+    result = fn(*args)
+    return result, start, time.time() - start
+
+
+def _timed_remote(fn: Callable[..., T], *args) -> "tuple[T, float, float, Optional[tuple]]":
+    """_timed in a worker process, also returning the metrics the stage recorded there."""
+    return (*_timed(fn, *args), metrics.drain())
+
+
+class StageExecutor:
+    def __init__(self, kind: str = EXECUTOR_KIND, workers: int = EXECUTOR_WORKERS):
+        if kind not in ("process", "thread", "inline"):
+            raise ValueError(f"Unknown EXECUTOR_KIND: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.in_flight = 0
+        self.timings: Dict[str, Dict[str, float]] = {}
+        self._pool: Optional[Executor] = None
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="stage")
+        return self._pool
+
+    def _replace_broken(self, pool: Executor) -> None:
+        # concurrent callers see the same broken pool; only the first replaces it
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            metrics.inc("executor_pool_restarts_total")
+
+    async def _run_remote(self, fn: Callable[..., T], *args):
+        for attempt in range(2):
+            pool = self.pool
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, _timed_remote, fn, *args)
+            except BrokenProcessPool:
+                self._replace_broken(pool)
+                if attempt:
+                    raise
+
+    def _record(self, stage: str, wait: float, run: float) -> None:
+        t = self.timings.setdefault(stage, {"count": 0, "wait_total": 0.0, "run_total": 0.0, "run_max": 0.0})
+        t["count"] += 1
+        t["wait_total"] += wait
+        t["run_total"] += run
+        t["run_max"] = max(t["run_max"], run)
+        metrics.observe("executor_wait_seconds", wait, stage=stage)
+        metrics.observe("executor_run_seconds", run, stage=stage)
+
+    async def run(self, stage: str, fn: Callable[..., T], *args, inline: bool = False) -> T:
+        """Run ``fn(*args)`` for ``stage`` in the pool and record its timings."""
+        if inline or self.kind == "inline":
+            result, _, elapsed = _timed(fn, *args)
+            self._record(stage, 0.0, elapsed)
+            return result
+        submitted = time.time()
+        self.in_flight += 1
+        try:
+            if self.kind == "process":
+                result, started, elapsed, recorded = await self._run_remote(fn, *args)
+                metrics.merge(recorded)
+            else:
+                result, started, elapsed = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, _timed, fn, *args
+                )
+        finally:
+            self.in_flight -= 1
+        self._record(stage, max(0.0, started - submitted), elapsed)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.workers),
+            "stages": {
+                stage: {
+                    "count": int(t["count"]),
+                    "avg_wait_ms": round(t["wait_total"] / t["count"] * 1000, 3),
+                    "avg_run_ms": round(t["run_total"] / t["count"] * 1000, 3),
+                    "max_run_ms": round(t["run_max"] * 1000, 3),
+                }
+                for stage, t in self.timings.items()
+            },
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+executor = StageExecutor()
@@ -0,0 +1,184 @@
+"""Shared async page fetcher backed by one pooled keep-alive HTTP session.
+
+aiohttp is imported when the first session is created, not with this module.
+"""
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional, Tuple
+
+import metrics
+from parsers import decode_body
+
+if TYPE_CHECKING:
+    import aiohttp
+
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "10"))
+FETCH_MAX_BYTES = int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+FETCH_POOL_SIZE = int(os.getenv("FETCH_POOL_SIZE", "256"))
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "8"))
+CHUNK_SIZE = 64 * 1024
+
+_session: Optional["aiohttp.ClientSession"] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class FetchError(Exception):
+    """Raised when a page cannot be fetched (network error, timeout or HTTP error)."""
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    body: bytes
+    reason: str = ""
+    encoding: str = "utf-8"
+    headers: Dict[str, str] = field(default_factory=dict)
+    truncated: bool = False
+
+    @property
+    def text(self) -> str:
+        return decode_body(self.body, self.encoding)
+
+
+def _trace_config() -> "aiohttp.TraceConfig":
+    """Time DNS lookups, connects and time to response headers of every request."""
+
+    async def request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def request_end(session, ctx, params):
+        metrics.observe("stage_seconds", time.perf_counter() - ctx.start, stage="fetch_ttfb")
+        metrics.inc("fetch_responses_total", status=f"{params.response.status // 100}xx")
+
+    async def dns_start(session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def dns_end(session, ctx, params):
+        metrics.observe("stage_seconds", time.perf_counter() - ctx.dns_start, stage="fetch_dns")
+
+    async def connect_start(session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def connect_end(session, ctx, params):
+        metrics.observe("stage_seconds", time.perf_counter() - ctx.connect_start, stage="fetch_connect")
+
+    import aiohttp
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(request_start)
+    trace.on_request_end.append(request_end)
+    trace.on_dns_resolvehost_start.append(dns_start)
+    trace.on_dns_resolvehost_end.append(dns_end)
+    trace.on_connection_create_start.append(connect_start)
+    trace.on_connection_create_end.append(connect_end)
+    return trace
+
+
+def get_session() -> "aiohttp.ClientSession":
+    """Return the process-wide client session, creating it for the running loop."""
+    global _session, _session_loop
+    import aiohttp
+
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=FETCH_POOL_SIZE,
+            limit_per_host=FETCH_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT),
+            trace_configs=[_trace_config()] if metrics.METRICS_ENABLED else None,
+        )
+        _session_loop = loop
+    return _session
+
+
+async def close_session() -> None:
+    global _session, _session_loop
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session, _session_loop = None, None
+
+
+@asynccontextmanager
+async def stream_page(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    raise_for_status: bool = False,
+) -> AsyncIterator["aiohttp.ClientResponse"]:
+    """Open ``url`` and yield the response with its body still unread.
+
+    Read the body with ``iter_body``; network errors while reading inside the
+    block are raised as FetchError.
+    """
+    import aiohttp
+
+    try:
+        async with get_session().get(url, headers=headers, allow_redirects=True) as r:
+            if raise_for_status and r.status >= 400:
+                raise FetchError(f"{r.status} {r.reason} for url: {r.url}")
+            yield r
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        metrics.inc("fetch_errors_total", error=e.__class__.__name__)
+        raise FetchError(str(e) or e.__class__.__name__) from e
+
+
+async def iter_body(r: "aiohttp.ClientResponse") -> AsyncIterator[bytes]:
+    """Body chunks of ``r``, counted as downloaded bytes.
+
+    The download is timed when the body has been read to the end; with a
+    streaming consumer that includes the time spent between chunks.
+    """
+    start = time.perf_counter()
+    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+        metrics.inc("fetch_bytes_total", len(chunk))
+        yield chunk
+    metrics.observe("stage_seconds", time.perf_counter() - start, stage="fetch_download")
+
+
+async def read_body(chunks: AsyncIterator[bytes], limit: int) -> Tuple[bytes, bool]:
+    """Read ``chunks`` into memory, cutting off at ``limit`` bytes."""
+    parts, size = [], 0
+    async for chunk in chunks:
+        if size + len(chunk) > limit:
+            parts.append(chunk[: limit - size])
+            return b"".join(parts), True
+        parts.append(chunk)
+        size += len(chunk)
+    return b"".join(parts), False
+
+
+def to_result(r: "aiohttp.ClientResponse", body: bytes = b"", truncated: bool = False) -> FetchResult:
+    return FetchResult(
+        url=str(r.url),
+        status=r.status,
+        body=body,
+        reason=r.reason or "",
+        encoding=r.charset or "utf-8",
+        headers={k.lower(): v for k, v in r.headers.items()},
+        truncated=truncated,
+    )
+
+
+async def fetch_page(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    raise_for_status: bool = False,
+    max_bytes: Optional[int] = None,
+) -> FetchResult:
+    """Fetch ``url`` without blocking the event loop.
+
+    The body is read in chunks and cut off at ``max_bytes`` (``FETCH_MAX_BYTES``
+    by default); a cut-off body is returned with ``truncated=True``.
+    """
+    limit = FETCH_MAX_BYTES if max_bytes is None else max_bytes
+    async with stream_page(url, headers=headers, raise_for_status=raise_for_status) as r:
+        body, truncated = await read_body(iter_body(r), limit)
+        return to_result(r, body, truncated)
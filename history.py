@@ -0,0 +1,214 @@
+"""Audit history in the db.py SQLite database.
+
+Every audit becomes one compact AuditRecord: integer url and site ids, the
+score, failed rules as a bitmask over ISSUE_CODES, keyword ids packed as
+uint32 and the audit duration. Records are indexed by (url, time) and
+(site, time), and per-site daily rollups of scores and issue counts are
+updated in the same transaction, so trend queries read at most one row per
+day no matter how many records there are.
+"""
+import time
+from array import array
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from cache import normalize_url, site_host
+from db import AuditDaily, AuditIssueDaily, AuditRecord, HistoryKeyword, HistorySite, HistoryUrl, engine
+from rules import RULES
+
+DAY = 86400
+ID_CACHE_SIZE = 100_000
+
+# Bit positions of the issue mask. Append only: stored masks depend on the order.
+ISSUE_CODES = (
+    "missing_title", "title_short", "no_meta_description", "no_h1", "thin_content",
+    "title_long", "meta_description_length", "noindex", "no_canonical", "multiple_h1", "no_links",
+)
+ISSUE_BITS = {code: bit for bit, code in enumerate(ISSUE_CODES)}
+assert all(r.code in ISSUE_BITS for r in RULES), "add new rule codes to ISSUE_CODES"
+
+records = AuditRecord.__table__
+daily = AuditDaily.__table__
+issue_daily = AuditIssueDaily.__table__
+
+_ids: Dict[Tuple[str, str], int] = {}
+
+
+def issue_mask(codes: List[str]) -> int:
+    mask = 0
+    for code in codes:
+        if code in ISSUE_BITS:
+            mask |= 1 << ISSUE_BITS[code]
+    return mask
+
+
+def issue_codes(mask: int) -> List[str]:
+    return [code for bit, code in enumerate(ISSUE_CODES) if mask >> bit & 1]
+
+
+def _get_id(conn, table, column: str, value: str, new: Dict, **extra) -> int:
+    """Id of ``value`` in a lookup table, inserting it if needed."""
+    key = (table.name, value)
+    if key in _ids:
+        return _ids[key]
+    col = table.c[column]
+    conn.execute(sqlite_insert(table).values({column: value, **extra}).on_conflict_do_nothing())
+    new[key] = conn.execute(select(table.c.id).where(col == value)).scalar_one()
+    return new[key]
+
+
+def _find_id(conn, table, column: str, value: str) -> Optional[int]:
+    key = (table.name, value)
+    if key not in _ids:
+        found = conn.execute(select(table.c.id).where(table.c[column] == value)).scalar()
+        if found is None:
+            return None
+        _ids[key] = found
+    return _ids[key]
+
+
+def record_audit(url: str, audit: dict, duration_ms: int = 0, skipped: bool = False, ts: Optional[float] = None) -> None:
+    ts = int(time.time() if ts is None else ts)
+    day = ts // DAY * DAY
+    score = audit["overview"]["score"]
+    mask = issue_mask([i["code"] for i in audit["issues"] if "code" in i])
+    new: Dict[Tuple[str, str], int] = {}
+
+    daily_upsert = sqlite_insert(daily)
+    daily_upsert = daily_upsert.on_conflict_do_update(
+        index_elements=["site_id", "day"],
+        set_={
+            "audits": daily.c.audits + 1,
+            "score_sum": daily.c.score_sum + daily_upsert.excluded.score_sum,
+            "score_min": func.min(daily.c.score_min, daily_upsert.excluded.score_min),
+            "score_max": func.max(daily.c.score_max, daily_upsert.excluded.score_max),
+        },
+    )
+    issue_upsert = sqlite_insert(issue_daily)
+    issue_upsert = issue_upsert.on_conflict_do_update(
+        index_elements=["site_id", "day", "issue"],
+        set_={"count": issue_daily.c.count + 1},
+    )
+
+    with engine.begin() as conn:
+        site_id = _get_id(conn, HistorySite.__table__, "host", site_host(url), new)
+        url_id = _get_id(conn, HistoryUrl.__table__, "url", normalize_url(url), new, site_id=site_id)
+        keyword_ids = [_get_id(conn, HistoryKeyword.__table__, "term", k, new) for k in audit.get("keywords", [])]
+        conn.execute(insert(records).values(
+            url_id=url_id,
+            site_id=site_id,
+            ts=ts,
+            score=score,
+            issue_mask=mask,
+            keyword_ids=array("I", keyword_ids).tobytes(),
+            duration_ms=int(duration_ms),
+            skipped=skipped,
+        ))
+        conn.execute(daily_upsert, {
+            "site_id": site_id, "day": day, "audits": 1, "score_sum": score, "score_min": score, "score_max": score,
+        })
+        bits = [bit for bit in range(len(ISSUE_CODES)) if mask >> bit & 1]
+        if bits:
+            conn.execute(issue_upsert, [{"site_id": site_id, "day": day, "issue": bit, "count": 1} for bit in bits])
+    # only cache ids that were committed
+    if len(_ids) + len(new) > ID_CACHE_SIZE:
+        _ids.clear()
+    _ids.update(new)
+
+
+def _site_key(site: str) -> str:
+    return site_host(site if "//" in site else f"//{site}")
+
+
+def _since(days: int) -> int:
+    return (int(time.time()) - days * DAY) // DAY * DAY
+
+
+def url_trend(url: str, days: int = 90) -> List[dict]:
+    """Every audit of ``url`` in the last ``days`` days, oldest first."""
+    c = records.c
+    t = HistoryKeyword.__table__
+    with engine.connect() as conn:
+        url_id = _find_id(conn, HistoryUrl.__table__, "url", normalize_url(url))
+        if url_id is None:
+            return []
+        rows = conn.execute(
+            select(c.ts, c.score, c.issue_mask, c.keyword_ids, c.duration_ms, c.skipped)
+            .where(c.url_id == url_id, c.ts >= _since(days))
+            .order_by(c.ts)
+        ).all()
+        ids = {i for row in rows for i in array("I", row.keyword_ids)}
+        terms = dict(conn.execute(select(t.c.id, t.c.term).where(t.c.id.in_(ids))).all()) if ids else {}
+    return [
+        {
+            "ts": ts,
+            "score": score,
+            "issues": issue_codes(mask),
+            "keywords": [terms[i] for i in array("I", kw) if i in terms],
+            "duration_ms": ms,
+            "skipped": bool(skipped),
+        }
+        for ts, score, mask, kw, ms, skipped in rows
+    ]
+
+
+def site_trend(site: str, days: int = 90) -> List[dict]:
+    """Daily audit count and average/min/max score for ``site``."""
+    c = daily.c
+    with engine.connect() as conn:
+        site_id = _find_id(conn, HistorySite.__table__, "host", _site_key(site))
+        if site_id is None:
+            return []
+        rows = conn.execute(
+            select(c.day, c.audits, c.score_sum, c.score_min, c.score_max)
+            .where(c.site_id == site_id, c.day >= _since(days))
+            .order_by(c.day)
+        ).all()
+    return [
+        {"day": day, "audits": n, "avg_score": round(total / n, 1), "min_score": lo, "max_score": hi}
+        for day, n, total, lo, hi in rows
+    ]
+
+
+def issue_counts(site: Optional[str] = None, days: int = 90) -> Dict[str, int]:
+    """Failed-rule counts by issue code, for one site or all of them."""
+    c = issue_daily.c
+    where = [c.day >= _since(days)]
+    with engine.connect() as conn:
+        if site:
+            site_id = _find_id(conn, HistorySite.__table__, "host", _site_key(site))
+            if site_id is None:
+                return {}
+            where.append(c.site_id == site_id)
+        rows = conn.execute(select(c.issue, func.sum(c.count)).where(*where).group_by(c.issue)).all()
+    counts = Counter({ISSUE_CODES[bit]: int(n) for bit, n in rows if bit < len(ISSUE_CODES)})
+    return dict(counts.most_common())
+
+
+def iter_site_pages(site: str, batch: int = 500) -> Iterator[dict]:
+    """The latest audit of every URL of ``site``, streamed from the database in URL order."""
+    c, u = records.c, HistoryUrl.__table__.c
+    inner = records.alias()
+    # several audits of a URL can share a second; the last one recorded wins
+    latest = (
+        select(inner.c.id)
+        .where(inner.c.url_id == c.url_id)
+        .order_by(inner.c.ts.desc(), inner.c.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    with engine.connect() as conn:
+        site_id = _find_id(conn, HistorySite.__table__, "host", _site_key(site))
+        if site_id is None:
+            return
+        result = conn.execution_options(yield_per=batch).execute(
+            select(u.url, c.score, c.issue_mask)
+            .join(HistoryUrl.__table__, u.id == c.url_id)
+            .where(c.site_id == site_id, c.id == latest)
+            .order_by(u.url)
+        )
+        for url, score, mask in result:
+            yield {"url": url, "score": score, "issues": issue_codes(mask)}
@@ -0,0 +1,244 @@
+"""Background jobs for long-running audits and PDF exports.
+
+Jobs are stored in the db.py SQLite database, queued in a bounded in-memory
+queue and run by JOB_WORKERS runners. Audit jobs go through
+pipeline.audit_page like foreground audits; the CPU-bound PDF render is
+handed to the shared stage executor. Finished results are kept for JOB_RESULT_TTL seconds.
+
+Each process renews a JOB_LEASE-second lease on the jobs it queued. A
+queued or running job whose lease ran out belongs to a process that died
+and is failed by whichever worker notices first, so a restarting uvicorn
+worker leaves the jobs of the other workers alone.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Optional
+
+from executor import executor
+from pipeline import audit_page, report_audit
+
+if TYPE_CHECKING:
+    from db import Job
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(os.cpu_count() or 2)))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+JOB_LEASE = int(os.getenv("JOB_LEASE", "60"))
+EXPIRE_INTERVAL = 60
+
+logger = logging.getLogger(__name__)
+
+# db and SQLAlchemy are slow to import; the functions that store jobs load them on first use
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at JOB_QUEUE_SIZE."""
+
+
+async def audit_task(url: str) -> bytes:
+    # through audit_page, so an unchanged page reuses its stored audit
+    audit, _ = await audit_page(url, headers={"User-Agent": "Bot"})
+    return json.dumps({**audit, "url": url}).encode()
+
+
+def _render_pdf(audit: dict) -> bytes:
+    from report import render_audit_pdf  # reportlab is slow to import; load it on first export
+
+    return render_audit_pdf(audit)
+
+
+async def pdf_task(url: str) -> bytes:
+    # the same audit and renderer as /api/export/pdf; a fresh audit goes into the history
+    audit = await report_audit(url, headers={"User-Agent": "Bot"})
+    return await executor.run("pdf", _render_pdf, audit)
+
+
+TASKS = {
+    "audit": (audit_task, "application/json"),
+    "pdf": (pdf_task, "application/pdf"),
+}
+
+
+def job_status(job: "Job") -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result_url": f"/api/jobs/{job.id}/result" if job.status == "done" else None,
+    }
+
+
+def _insert(job: "Job") -> "Job":
+    from sqlmodel import Session
+    from db import engine
+
+    with Session(engine) as session:
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+def _expire(now: datetime) -> None:
+    from sqlalchemy import delete
+    from sqlmodel import Session, col
+    from db import Job, engine
+
+    with Session(engine) as session:
+        session.execute(delete(Job).where(col(Job.expires_at) < now))
+        session.commit()
+
+
+def _renew_leases(owner: str, now: datetime) -> int:
+    """Extend the leases of ``owner``'s unfinished jobs and fail those whose lease ran out."""
+    from sqlalchemy import update
+    from sqlmodel import Session, col
+    from db import Job, engine
+
+    unfinished = col(Job.status).in_(["queued", "running"])
+    with Session(engine) as session:
+        session.execute(
+            update(Job)
+            .where(unfinished, col(Job.owner) == owner)
+            .values(lease_until=now + timedelta(seconds=JOB_LEASE))
+        )
+        # the in-memory queue of a dead process is gone; its jobs cannot finish
+        failed = session.execute(
+            update(Job)
+            .where(unfinished, col(Job.owner).is_distinct_from(owner))
+            .where((col(Job.lease_until) < now) | col(Job.lease_until).is_(None))
+            .values(
+                status="failed", error="Interrupted by restart", finished_at=now,
+                expires_at=now + timedelta(seconds=JOB_RESULT_TTL),
+            )
+        ).rowcount
+        session.commit()
+    return failed
+
+
+def _update(job_id: str, **fields) -> Optional["Job"]:
+    from sqlmodel import Session
+    from db import Job, engine
+
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        if job is None:
+            return None
+        for name, value in fields.items():
+            setattr(job, name, value)
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        return job
+
+
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_SIZE):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.queue: Optional[asyncio.Queue] = None
+        self.owner = uuid.uuid4().hex
+        self._tasks = []
+
+    async def start(self) -> None:
+        await asyncio.to_thread(_renew_leases, self.owner, datetime.utcnow())
+        self.queue = asyncio.Queue(self.maxsize)
+        self._tasks = [asyncio.ensure_future(self._runner()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._expire_loop()))
+        self._tasks.append(asyncio.ensure_future(self._lease_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, kind: str, url: str) -> "Job":
+        if kind not in TASKS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self.queue is None or self.queue.full():
+            raise QueueFull("Job queue is full, try again later")
+        from db import Job
+
+        job = Job(
+            id=uuid.uuid4().hex, kind=kind, params=json.dumps({"url": url}),
+            owner=self.owner, lease_until=datetime.utcnow() + timedelta(seconds=JOB_LEASE),
+        )
+        job = await asyncio.to_thread(_insert, job)
+        try:
+            self.queue.put_nowait(job.id)
+        except asyncio.QueueFull:
+            # filled up by other submits while the row was being written
+            await asyncio.to_thread(_update, job.id, status="failed", error="Job queue is full", finished_at=datetime.utcnow())
+            raise QueueFull("Job queue is full, try again later")
+        return job
+
+    async def get(self, job_id: str) -> Optional["Job"]:
+        from db import Job, async_session
+
+        async with async_session() as session:
+            job = await session.get(Job, job_id)
+        if job is not None and job.expires_at is not None and job.expires_at < datetime.utcnow():
+            return None
+        return job
+
+    async def _runner(self) -> None:
+        while True:
+            job_id = await self.queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. a locked database while updating the job row; keep serving the queue
+                logger.exception("job %s failed to run", job_id)
+                try:
+                    await asyncio.to_thread(
+                        _update, job_id, status="failed", error="Internal error", finished_at=datetime.utcnow(),
+                        expires_at=datetime.utcnow() + timedelta(seconds=JOB_RESULT_TTL),
+                    )
+                except Exception:
+                    logger.exception("could not mark job %s failed", job_id)
+            finally:
+                self.queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = await asyncio.to_thread(_update, job_id, status="running")
+        if job is None:
+            return
+        fn, media_type = TASKS[job.kind]
+        url = json.loads(job.params)["url"]
+        try:
+            result = await fn(url)
+        except Exception as e:
+            fields = {"status": "failed", "error": str(e) or e.__class__.__name__}
+        else:
+            fields = {"status": "done", "result": result, "media_type": media_type}
+        now = datetime.utcnow()
+        await asyncio.to_thread(_update, job_id, finished_at=now, expires_at=now + timedelta(seconds=JOB_RESULT_TTL), **fields)
+
+    async def _expire_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(_expire, datetime.utcnow())
+            except Exception:
+                logger.exception("expiring finished jobs failed")
+            await asyncio.sleep(EXPIRE_INTERVAL)
+
+    async def _lease_loop(self) -> None:
+        while True:
+            await asyncio.sleep(JOB_LEASE / 3)
+            try:
+                await asyncio.to_thread(_renew_leases, self.owner, datetime.utcnow())
+            except Exception:
+                logger.exception("renewing job leases failed")
+
+
+job_queue = JobQueue()
@@ -0,0 +1,294 @@
+"""Keyword engine: n-gram counting with stopword filtering and TF-IDF ranking.
+
+Tokens are counted once into unigrams, bigrams and trigrams with NumPy
+arrays when NumPy is installed (plain Counters otherwise). Terms are scored
+by TF-IDF against the document-frequency index in df_index.py, built from
+previously audited pages, and the top k are taken with a heap instead of
+sorting the vocabulary. A kept phrase absorbs the shorter terms it contains,
+so "seo audit tool" is not listed next to "seo", "audit" and "seo audit".
+Streamed pages are counted incrementally with TermCounter instead.
+"""
+import heapq
+import math
+import os
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from df_index import DocumentFrequency, document_frequency
+
+MAX_NGRAM = 3
+MIN_WORD_LENGTH = 3
+MIN_PHRASE_COUNT = 2  # bigrams/trigrams must repeat to count as keywords
+INT64_LIMIT = 2 ** 63
+# streamed pages count terms as they go, keeping at most this many distinct terms per n
+TERM_VOCAB_MAX = int(os.getenv("TERM_VOCAB_MAX", "100000"))
+TERM_BATCH = 500_000  # token ids buffered between counting passes
+CANDIDATE_FACTOR = 4  # terms ranked per keyword wanted before falling back to a full sort
+
+_np = None  # numpy once loaded, False when it is not installed
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further get
+got had has have having he her here hers herself him himself his how i if in into is it its itself
+just like may me might more most must my myself no nor not now of off on once only or other our
+ours ourselves out over own same she should so some such than that the their theirs them
+themselves then there these they this those through to too under until up upon us very was we
+were what when where which while who whom why will with would you your yours yourself yourselves
+one two new use used using make made many much via per get see way well even back still every
+""".split())
+
+
+def _bad_edge(word: str) -> bool:
+    return word in STOPWORDS or word.isdigit()
+
+
+def _bad_unigram(word: str) -> bool:
+    return _bad_edge(word) or len(word) < MIN_WORD_LENGTH
+
+
+def _counts_python(tokens: List[str], max_n: int) -> Dict[str, int]:
+    counts = {w: c for w, c in Counter(tokens).items() if not _bad_unigram(w)}
+    for n in range(2, max_n + 1):
+        grams = Counter(zip(*(tokens[i:] for i in range(n))))
+        for gram, c in grams.items():
+            if c >= MIN_PHRASE_COUNT and not _bad_edge(gram[0]) and not _bad_edge(gram[-1]):
+                counts[" ".join(gram)] = c
+    return counts
+
+
+def _counts_numpy(tokens: List[str], max_n: int) -> Dict[str, int]:
+    np = load_numpy()
+    vocab: Dict[str, int] = {}
+    ids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64, count=len(tokens))
+    words = list(vocab)
+    size = len(words)
+    bad_edge = np.fromiter((_bad_edge(w) for w in words), dtype=bool, count=size)
+    bad_unigram = bad_edge | np.fromiter((len(w) < MIN_WORD_LENGTH for w in words), dtype=bool, count=size)
+
+    unigram = np.bincount(ids, minlength=size)
+    counts = {words[i]: int(unigram[i]) for i in np.flatnonzero(~bad_unigram)}
+    for n in range(2, max_n + 1):
+        span = len(ids) - n + 1
+        if span <= 0 or size ** n >= INT64_LIMIT:
+            break
+        # encode each n-gram as one integer in base ``size``
+        keys = ids[:span].copy()
+        for j in range(1, n):
+            keys = keys * size + ids[j:j + span]
+        keys = keys[~bad_edge[ids[:span]] & ~bad_edge[ids[n - 1:n - 1 + span]]]
+        grams, gram_counts = np.unique(keys, return_counts=True)
+        repeated = gram_counts >= MIN_PHRASE_COUNT
+        for key, c in zip(grams[repeated].tolist(), gram_counts[repeated].tolist()):
+            parts = []
+            for _ in range(n):
+                key, idx = divmod(key, size)
+                parts.append(words[idx])
+            counts[" ".join(reversed(parts))] = c
+    return counts
+
+
+def load_numpy():
+    """Import numpy on first use (it is an optional speedup and slow to import)."""
+    global _np
+    if _np is None:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - optional speedup
+            numpy = False
+        _np = numpy
+    return _np
+
+
+def term_counts(tokens: List[str], max_n: int = MAX_NGRAM) -> Dict[str, int]:
+    """Counts of candidate keyword terms (unigrams and repeated phrases) in ``tokens``."""
+    if not tokens:
+        return {}
+    if load_numpy():
+        return _counts_numpy(tokens, max_n)
+    return _counts_python(tokens, max_n)
+
+
+def _prune(counter: Counter, limit: int) -> None:
+    """Drop the rarest entries until ``counter`` is at most half of ``limit``."""
+    floor = 1
+    while len(counter) > limit // 2:
+        for key in [key for key, c in counter.items() if c <= floor]:
+            del counter[key]
+        floor += 1
+
+
+def _prune_arrays(keys, counts, limit: int):
+    floor = 1
+    while len(keys) > limit // 2:
+        keep = counts > floor
+        keys, counts = keys[keep], counts[keep]
+        floor += 1
+    return keys, counts
+
+
+class TermCounter:
+    """term_counts over a token stream, without keeping the tokens.
+
+    Tokens are mapped to ids in a vocabulary of at most ``max_vocab`` words
+    (later new words are ignored) and buffered in batches of TERM_BATCH ids.
+    Each batch is counted into unigram, bigram and trigram tables, with the
+    last ``max_n - 1`` ids of the previous batch so phrases spanning batches
+    count too. A phrase table that outgrows ``max_vocab`` entries loses its
+    rarest entries.
+    """
+
+    KEY_BITS = 21  # n-grams are packed into one int64, KEY_BITS per word id
+
+    def __init__(self, max_n: int = MAX_NGRAM, max_vocab: int = TERM_VOCAB_MAX):
+        self.max_n = max_n
+        self.max_vocab = min(max_vocab, (1 << self.KEY_BITS) - 1)
+        self.pruned = False
+        self.vocab: Dict[str, int] = {}
+        self._batch = array("q")
+        self._tail = array("q")
+        self._unigrams: Counter = Counter()
+        # n -> (keys, counts): sorted numpy arrays, or a Counter of id tuples without numpy
+        self._grams: Dict[int, object] = {}
+
+    def _id(self, token: str) -> int:
+        i = self.vocab.get(token)
+        if i is None:
+            if len(self.vocab) >= self.max_vocab:
+                self.pruned = True
+                return -1
+            i = self.vocab[token] = len(self.vocab)
+        return i
+
+    def add(self, tokens: List[str]) -> None:
+        self._batch.extend(map(self._id, tokens))
+        if len(self._batch) >= TERM_BATCH:
+            self._count()
+
+    def _count(self) -> None:
+        ids, start = self._tail + self._batch, len(self._tail)
+        self._unigrams.update(self._batch)
+        for n in range(2, self.max_n + 1):
+            # only n-grams that end in the new ids
+            seq = ids[max(0, start - n + 1):]
+            if len(seq) >= n:
+                if load_numpy():
+                    self._count_numpy(n, seq)
+                else:
+                    self._count_python(n, seq)
+        self._tail = ids[len(ids) - self.max_n + 1:] if self.max_n > 1 else array("q")
+        self._batch = array("q")
+
+    def _count_python(self, n: int, seq) -> None:
+        grams = self._grams.setdefault(n, Counter())
+        grams.update(g for g in zip(*(seq[i:] for i in range(n))) if min(g) >= 0)
+        if len(grams) > self.max_vocab:
+            _prune(grams, self.max_vocab)
+            self.pruned = True
+
+    def _count_numpy(self, n: int, seq) -> None:
+        np = load_numpy()
+        ids = np.frombuffer(seq, dtype=np.int64)
+        span = len(ids) - n + 1
+        keys, valid = ids[:span].copy(), ids[:span] >= 0
+        for j in range(1, n):
+            keys = (keys << self.KEY_BITS) | ids[j:j + span]
+            valid &= ids[j:j + span] >= 0
+        batch_keys, batch_counts = np.unique(keys[valid], return_counts=True)
+        if n in self._grams:
+            old_keys, old_counts = self._grams[n]
+            merged, inverse = np.unique(np.concatenate([old_keys, batch_keys]), return_inverse=True)
+            counts = np.bincount(inverse, weights=np.concatenate([old_counts, batch_counts])).astype(np.int64)
+            batch_keys, batch_counts = merged, counts
+        if len(batch_keys) > self.max_vocab:
+            batch_keys, batch_counts = _prune_arrays(batch_keys, batch_counts, self.max_vocab)
+            self.pruned = True
+        self._grams[n] = (batch_keys, batch_counts)
+
+    def _phrases(self, n: int):
+        """(id tuple, count) pairs of the n-grams seen at least MIN_PHRASE_COUNT times."""
+        grams = self._grams.get(n)
+        if grams is None:
+            return
+        if isinstance(grams, Counter):
+            yield from ((g, c) for g, c in sorted(grams.items()) if c >= MIN_PHRASE_COUNT)
+            return
+        keys, counts = grams
+        mask = (1 << self.KEY_BITS) - 1
+        repeated = counts >= MIN_PHRASE_COUNT
+        for key, c in zip(keys[repeated].tolist(), counts[repeated].tolist()):
+            yield tuple((key >> (self.KEY_BITS * (n - 1 - j))) & mask for j in range(n)), c
+
+    def counts(self) -> Dict[str, int]:
+        """The same terms and counts term_counts gives for all tokens added so far."""
+        if self._batch:
+            self._count()
+        words = list(self.vocab)
+        counts = {w: self._unigrams[i] for i, w in enumerate(words) if not _bad_unigram(w)}
+        for n in range(2, self.max_n + 1):
+            for gram, c in self._phrases(n):
+                if not _bad_edge(words[gram[0]]) and not _bad_edge(words[gram[-1]]):
+                    counts[" ".join(words[i] for i in gram)] = c
+        return counts
+
+
+def document_terms(tokens: List[str]) -> Set[str]:
+    return set(term_counts(tokens))
+
+
+def score_terms(counts: Dict[str, int], df: Optional[DocumentFrequency] = None) -> Dict[str, float]:
+    df = document_frequency if df is None else df
+    n_docs = df.n_docs
+    terms = list(counts)
+    return {
+        term: (1 + math.log(counts[term])) * (math.log((1 + n_docs) / (1 + n)) + 1)
+        for term, n in zip(terms, df.df_many(terms))
+    }
+
+
+def _ranked(scores: Dict[str, float], k: int) -> Iterator[str]:
+    # ties are broken by the term itself, so the rank does not depend on how the counts were built
+    def rank(term: str) -> Tuple[float, str]:
+        return -scores[term], term
+
+    window = heapq.nsmallest(CANDIDATE_FACTOR * k, scores, key=rank)
+    yield from window
+    if len(window) < len(scores):
+        yield from sorted(scores, key=rank)[len(window):]
+
+
+def _covers(phrase: str, term: str) -> bool:
+    return f" {term} " in f" {phrase} "
+
+
+def drop_covered(ranked: Iterable[str], k: int) -> List[str]:
+    """The first ``k`` of ``ranked``, skipping terms a kept longer phrase contains.
+
+    A phrase that contains already kept shorter terms takes the place of the
+    first of them.
+    """
+    kept: List[str] = []
+    for term in ranked:
+        n = term.count(" ")
+        if any(other.count(" ") > n and _covers(other, term) for other in kept):
+            continue
+        covered = [i for i, other in enumerate(kept) if other.count(" ") < n and _covers(term, other)]
+        if covered:
+            kept[covered[0]] = term
+            kept = [other for i, other in enumerate(kept) if i not in covered[1:]]
+        else:
+            kept.append(term)
+        if len(kept) == k:
+            break
+    return kept
+
+
+def top_terms(counts: Dict[str, int], k: int = 10, df: Optional[DocumentFrequency] = None) -> List[str]:
+    """The ``k`` highest TF-IDF terms of ``counts`` without overlapping n-grams; ties rank alphabetically."""
+    scores = score_terms(counts, df)
+    return drop_covered(_ranked(scores, k), k)
+
+
+def top_keywords(tokens: List[str], k: int = 10, df: Optional[DocumentFrequency] = None) -> List[str]:
+    return top_terms(term_counts(tokens), k, df)
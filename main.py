@@ -1,24 +1,115 @@
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import requests, json, re, uvicorn, os
-from bs4 import BeautifulSoup
-from collections import Counter
+from typing import List, Optional
+from urllib.parse import urlsplit
+import asyncio, json, os
 from datetime import datetime
-from pathlib import Path
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import inch
-from io import BytesIO
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from fetcher import FetchError, close_session
+from analysis import calculate_score, extract_keywords
+from pipeline import audit_page, load_head, load_page, pipeline_stats, report_audit
+from jobs import QueueFull, job_queue, job_status
+from executor import executor
+from analytics import INTERVALS, analytics_sink, event_stats
+from scheduler import create_schedule, delete_schedule, get_schedule, list_schedules, schedule_status, scheduler
+from rules import PLANS
+import metrics
+import profiler
+from responses import CompressionMiddleware, conditional_json
+import crawler
 
 
 app = FastAPI()
 
+# Heavy dependencies (reportlab, numpy, aiohttp, parser backends, SQLAlchemy) are
+# imported on first use so cold starts stay fast; WARM_UP=1 loads them at startup instead.
+WARM_UP = os.getenv("WARM_UP", "0") == "1"
 
+# answered without the database; every other request waits until it is set up
+NO_DB_PATHS = {"/health", "/__ping__"}
+# the database is set up on the first request that needs it, or this many seconds after start-up
+SERVICES_DELAY = float(os.getenv("SERVICES_DELAY", "2"))
+services: Optional[asyncio.Task] = None
+services_timer: Optional[asyncio.TimerHandle] = None
+
+
+def warm_up():
+    import importlib
+    import report
+    from keywords import load_numpy
+    from parsers import get_parser
+
+    importlib.import_module("aiohttp")
+    importlib.import_module("history")  # db and SQLAlchemy
+    report.warm_up()
+    load_numpy()
+    get_parser()
+
+
+async def start_services():
+    from db import create_db_and_tables
+
+    await asyncio.to_thread(create_db_and_tables)
+    await job_queue.start()
+    await scheduler.start()
+
+
+def ensure_services() -> asyncio.Task:
+    global services
+    if services is None:
+        services = asyncio.ensure_future(start_services())
+    return services
+
+
+class AwaitServices:
+    """Hold requests until start_services is done.
+
+    Importing SQLAlchemy in the background holds the GIL for a few hundred
+    milliseconds, so it is not started before a request needs it (or
+    SERVICES_DELAY passes) and health checks are answered meanwhile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] not in NO_DB_PATHS:
+            # shielded: a client that disconnects must not cancel the start-up
+            await asyncio.shield(ensure_services())
+        return await self.app(scope, receive, send)
+
+
+@app.on_event("startup")
+async def startup():
+    global services_timer
+    if WARM_UP:
+        await asyncio.to_thread(warm_up)
+        ensure_services()
+    await analytics_sink.start()
+    services_timer = asyncio.get_running_loop().call_later(SERVICES_DELAY, ensure_services)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    global services
+    if services_timer is not None:
+        services_timer.cancel()
+    if services is not None:
+        await asyncio.gather(services, return_exceptions=True)
+    await scheduler.stop()
+    await crawler.pause_all()
+    await job_queue.stop()
+    await analytics_sink.stop()
+    await close_session()
+    if services is not None:
+        from db import dispose_async_engine
+
+        await dispose_async_engine()
+        services = None
+    executor.shutdown()
 
 @app.get("/__ping__")
 def __ping__():
@@ -32,7 +123,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(AwaitServices)
+if profiler.PROFILER_ENABLED:
+    app.add_middleware(profiler.ProfilerMiddleware)
 
 
 @app.get("/api/rank")
@@ -57,31 +153,36 @@ def root():
 def test():
     return {"status": "ok", "message": "API is working"}
 
-ANALYTICS_FILE = Path("analytics.jsonl")
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "5000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+BATCH_PER_HOST = int(os.getenv("BATCH_PER_HOST", "4"))
+
 class AuditRequest(BaseModel):
     url: str
 
-def log_analytics(et, d):
-    with open(ANALYTICS_FILE, "a") as f:
-        f.write(json.dumps({"ts": datetime.now().isoformat(), "et": et, "d": d}) + "\n")
-
-def calculate_score(soup, tc):
-    s, i = 100, []
-    t = soup.title.string if soup.title else ""
-    if not t: s -= 20; i.append({"sev": "High", "msg": "Missing title"})
-    elif len(t) < 30: s -= 5; i.append({"sev": "Med", "msg": "Title short"})
-    if not soup.find("meta", {"name": "description"}): s -= 20; i.append({"sev": "High", "msg": "No meta desc"})
-    if not soup.find("h1"): s -= 20; i.append({"sev": "High", "msg": "No H1"})
-    wc = len(tc.split())
-    if wc < 300: s -= 20; i.append({"sev": "High", "msg": f"Thin ({wc} words)"})
-    return max(0, s), i
-
-def extract_keywords(text):
-    words = re.findall(r"\w+", text.lower())
-    return [w for w, c in Counter(words).most_common(10) if len(w) > 4]
+class BatchAuditRequest(BaseModel):
+    urls: List[str]
+
+class JobRequest(BaseModel):
+    kind: str
+    url: str
+
+class CrawlRequest(BaseModel):
+    url: str
+    max_pages: Optional[int] = None
+    max_depth: Optional[int] = None
+
+class ScheduleRequest(BaseModel):
+    url: str
+    interval_hours: float = 168
+    plan: str = "free"
+    user_id: Optional[int] = None
+
+async def log_analytics(et, d):
+    await analytics_sink.emit(et, d)
 
 @app.get("/api/analysis")
-async def analyze(request: Request, url: str):
+async def analyze(request: Request, url: str, head_only: bool = False):
     import logging
     logger = logging.getLogger("seo-analyzer")
     
@@ -93,25 +194,24 @@ async def analyze(request: Request, url: str):
         }
         logger.info(f"[ANALYZE] Fetching with headers: {headers}")
         
-        r = requests.get(url, headers=headers, timeout=10)
-        logger.info(f"[ANALYZE] Status code: {r.status_code}, URL: {r.url}")
-        
-        r.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"[ANALYZE] RequestException: {str(e)}")
+        load = load_head if head_only else load_page
+        page = await load(url, headers=headers, raise_for_status=True)
+        logger.info(f"[ANALYZE] Loaded page: {url}")
+    except FetchError as e:
+        logger.error(f"[ANALYZE] FetchError: {str(e)}")
         return {"error": f"Failed to fetch URL: {str(e)}", "score": 0, "issues": [], "keywords": []}
     
-    soup = BeautifulSoup(r.text, "html.parser")
-    s, i = calculate_score(soup, soup.get_text())
-    log_analytics("analyzed", {"url": url, "score": s})
-    return {"score": s, "issues": i, "keywords": extract_keywords(soup.get_text())}
+    s, i = calculate_score(page, head_only=head_only)
+    await log_analytics("analyzed", {"url": url, "score": s})
+    keywords = [] if head_only else await asyncio.to_thread(extract_keywords, page)
+    return {"score": s, "issues": i, "keywords": keywords}
 
 
 @app.post("/api/content-analysis")
 async def content_analysis(request: Request, data: AuditRequest):
     try:
         text = data.url  # Frontend sends content as url field
-        keywords = extract_keywords(text)
+        keywords = await asyncio.to_thread(extract_keywords, text)
         return {"keywords": keywords, "wordCount": len(text.split())}
     except Exception as e:
         return {"error": str(e), "keywords": [], "wordCount": 0}
@@ -120,37 +220,79 @@ async def content_analysis(request: Request, data: AuditRequest):
 async def keyword_research(request: Request, data: AuditRequest):
     try:
         text = data.url  # Frontend sends content as url field
-        keywords = extract_keywords(text)
+        keywords = await asyncio.to_thread(extract_keywords, text)
         return {"keywords": keywords}
     except Exception as e:
         return {"error": str(e), "keywords": []}
 
 @app.post("/api/export/pdf")
-async def pdf(request: Request, data: AuditRequest):
-    r = requests.get(data.url, headers={"User-Agent": "Bot"}, timeout=10)
-    soup = BeautifulSoup(r.text, "html.parser")
-    s, i = calculate_score(soup, soup.get_text())
-    buf = BytesIO()
-    doc = SimpleDocTemplate(buf, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = [Paragraph("SEO Audit", styles["Heading1"]), Spacer(1, 0.2*inch), Paragraph(f"URL: {data.url}", styles["Normal"]), Paragraph(f"Score: {s}/100", styles["Normal"]), Spacer(1, 0.2*inch), Paragraph("Issues:", styles["Heading2"])]
-    for issue in i:
-        story.append(Paragraph(f"• {issue['sev']}: {issue['msg']}", styles["Normal"]))
-    doc.build(story)
-    buf.seek(0)
-    log_analytics("pdf_exported", {"url": data.url})
-    return StreamingResponse(buf, media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=audit.pdf"})
+async def pdf(request: Request, data: AuditRequest, background: bool = False, fresh: bool = False):
+    if background:
+        return await submit_job("pdf", data.url)
+    # a recent stored audit is rendered as is; ?fresh=true re-audits the page first
+    audit = await report_audit(data.url, headers={"User-Agent": "Bot"}, fresh=fresh)
+    import report
+
+    pdf_bytes = await executor.run("pdf", report.render_audit_pdf, audit)
+    await log_analytics("pdf_exported", {"url": data.url})
+    return StreamingResponse(report.iter_chunks(pdf_bytes), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=audit.pdf"})
+
+@app.get("/api/export/site-pdf")
+async def site_pdf(site: str):
+    """PDF with the latest audited score and issues of every page of a site, from history"""
+    import history
+    import report
+
+    out = await asyncio.to_thread(report.spooled_site_report, site, history.iter_site_pages(site))
+    await log_analytics("site_pdf_exported", {"site": site})
+    return StreamingResponse(report.iter_chunks(out), media_type="application/pdf", headers={"Content-Disposition": "attachment; filename=site-report.pdf"})
 
 @app.get("/api/analytics/stats")
-async def stats():
-    if not ANALYTICS_FILE.exists():
-        return {"total_analyses": 0}
-    total = errors = 0
-    with open(ANALYTICS_FILE) as f:
-        for line in f:
-            e = json.loads(line)
-            if e.get("et") == "analyzed": total += 1
-    return {"total_analyses": total}
+async def stats(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    event: Optional[List[str]] = Query(None),
+    interval: Optional[str] = None,
+):
+    """Event counts from the indexed store; ?interval=hour|day adds a time series"""
+    if interval and interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"interval must be one of {', '.join(INTERVALS)}")
+    s = await asyncio.to_thread(event_stats, since=since, until=until, events=event, interval=interval)
+    return {"total_analyses": s["events"].get("analyzed", 0), **s}
+
+@app.get("/api/pipeline/stats")
+async def pipeline_stats_endpoint():
+    return pipeline_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def check_profiler_token(token: str):
+    if not profiler.PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Profiler not configured")
+    if not profiler.authorized(token):
+        raise HTTPException(status_code=403, detail="Invalid profiler token")
+
+@app.get("/api/admin/profiles")
+async def admin_profiles(endpoint: Optional[str] = None, x_profiler_token: str = Header("")):
+    check_profiler_token(x_profiler_token)
+    return {"profiles": profiler.list_profiles(endpoint)}
+
+@app.get("/api/admin/profiles/collapsed", response_class=PlainTextResponse)
+async def admin_profiles_collapsed(endpoint: Optional[str] = None, x_profiler_token: str = Header("")):
+    """All buffered profiles (or one endpoint's) merged, in collapsed-stack format"""
+    check_profiler_token(x_profiler_token)
+    return PlainTextResponse(profiler.collapsed(endpoint=endpoint))
+
+@app.get("/api/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def admin_profile(profile_id: int, x_profiler_token: str = Header("")):
+    check_profiler_token(x_profiler_token)
+    stacks = profiler.collapsed(profile_id=profile_id)
+    if stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(stacks)
+
 @app.get("/api/brief")
 async def brief(request: Request, topic: str = "", url: str = ""):
     """Generate a content brief with outline, keywords, and checklist"""
@@ -165,16 +307,20 @@ async def brief(request: Request, topic: str = "", url: str = ""):
     try:
         # If URL provided, fetch and extract text
         if is_url:
-            r = requests.get(input_text, headers={"User-Agent": "Bot"}, timeout=10)
-            soup = BeautifulSoup(r.text, "html.parser")
-            text = soup.get_text()
-            brief_topic = soup.title.string if soup.title else input_text
+            page = await load_page(input_text, headers={"User-Agent": "Bot"})
+            brief_topic = page.title or input_text
+            source = page if page.tokens or page.term_counts else None
         else:
             brief_topic = topic
-            text = topic
+            source = topic
         
         # Extract keywords
-        primary_keywords = [brief_topic] + extract_keywords(text)[:4] if text else [brief_topic]
+        keywords = await asyncio.to_thread(extract_keywords, source) if source else []
+        # the topic first, then page keywords it does not already repeat
+        primary = {}
+        for term in [brief_topic, *keywords]:
+            primary.setdefault(term.lower(), term)
+        primary_keywords = list(primary.values())[:5]
         
         # Generate secondary keywords
         secondary_keywords = [
@@ -232,10 +378,10 @@ async def brief(request: Request, topic: str = "", url: str = ""):
         }
         
         # Log the request
-        log_analytics("brief_generated", {"topic": brief_topic, "is_url": is_url})
+        await log_analytics("brief_generated", {"topic": brief_topic, "is_url": is_url})
         
         # Return the complete brief
-        return {
+        return conditional_json(request, {
             "topic": brief_topic,
             "intent": "informational",
             "outline": outline,
@@ -246,10 +392,10 @@ async def brief(request: Request, topic: str = "", url: str = ""):
             },
             "checklist": checklist,
             "internal_links": internal_links
-        }
+        })
     
     except Exception as e:
-        log_analytics("brief_error", {"error": str(e)})
+        await log_analytics("brief_error", {"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Error generating brief: {str(e)}")
 
 
@@ -257,65 +403,188 @@ async def brief(request: Request, topic: str = "", url: str = ""):
 
 
 @app.get("/api/audit")
-async def audit(url: str = ""):
+async def audit(request: Request, url: str = "", background: bool = False):
     """Full audit: combines analysis + brief + recommendations"""
     if not url:
         raise HTTPException(status_code=400, detail="URL parameter required")
+    if background:
+        return await submit_job("audit", url)
     
     try:
-        r = requests.get(url, headers={"User-Agent": "Bot"}, timeout=10)
-        soup = BeautifulSoup(r.text, "html.parser")
-        text = soup.get_text()
-        
-        title = soup.title.string if soup.title else "No title"
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        meta_desc_text = meta_desc.get("content") if meta_desc else "No meta description"
-        h1 = soup.find("h1")
-        h1_text = h1.get_text() if h1 else "No H1"
-        
-        score = calculate_score(soup, title)
-        keywords = extract_keywords(text)
-        
-        issues = []
-        if len(title) < 30:
-            issues.append({"sev": "Med", "msg": "Title short"})
-        if not meta_desc_text or meta_desc_text == "No meta description":
-            issues.append({"sev": "High", "msg": "No meta desc"})
-        if not h1 or h1_text == "No H1":
-            issues.append({"sev": "High", "msg": "No H1"})
-        if len(text.split()) < 300:
-            issues.append({"sev": "High", "msg": f"Thin ({len(text.split())} words)"})
-        
-        outline = [
-            {"title": "Introduction", "description": "Define topic and explain importance"},
-            {"title": "Why It Matters", "description": "Show business impact"},
-            {"title": "How-To Guide", "description": "Step-by-step implementation"},
-            {"title": "Best Practices", "description": "Tips and recommendations"},
-            {"title": "Conclusion & CTA", "description": "Summarize and drive action"}
-        ]
-        
-        return {
-            "url": url,
-            "overview": {
-                "score": score,
-                "title": title,
-                "metaDescription": meta_desc_text,
-                "h1": h1_text,
-                "wordCount": len(text.split())
-            },
-            "issues": issues,
-            "keywords": keywords[:10],
-            "brief": {
-                "outline": outline,
-                "wordCount": {"min": 1200, "max": 1800},
-                "checklist": [
-                    "Use primary keywords in title and H1",
-                    "Add compelling meta description (150-160 chars)",
-                    "Structure content with clear H2/H3 headings",
-                    "Include internal links to related pages",
-                    "Add clear call-to-action"
-                ]
-            }
-        }
+        result, _ = await audit_page(url, headers={"User-Agent": "Bot"})
+        # a reused audit carries the URL it was first stored under
+        return conditional_json(request, {**result, "url": url})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/audit/batch")
+async def audit_batch(data: BatchAuditRequest):
+    """Audit many URLs concurrently, streaming one NDJSON line per URL as it finishes"""
+    urls = [u.strip() for u in data.urls if u.strip()]
+    if not urls:
+        raise HTTPException(status_code=400, detail="urls must contain at least one URL")
+    if len(urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_URLS} URLs per batch")
+
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    host_slots = {}
+
+    async def run(url):
+        host = (urlsplit(url).hostname or "").lower()
+        host_slot = host_slots.setdefault(host, asyncio.Semaphore(BATCH_PER_HOST))
+        # take the host slot first so a busy host never holds global slots idle
+        async with host_slot, slots:
+            try:
+                result, _ = await audit_page(url, headers={"User-Agent": "Bot"})
+                # the audit may be shared with, or stored by, a URL that only normalizes the same
+                return {**result, "url": url}
+            except Exception as e:
+                return {"url": url, "error": str(e)}
+
+    async def results():
+        tasks = [asyncio.ensure_future(run(u)) for u in urls]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+        await log_analytics("batch_audited", {"urls": len(urls)})
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@app.post("/api/crawl")
+async def start_crawl(data: CrawlRequest):
+    """Start a whole-site crawl; poll GET /api/crawl/{id} for progress"""
+    if not data.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="url must be an absolute http(s) URL")
+    max_pages = min(data.max_pages or crawler.CRAWL_MAX_PAGES, crawler.CRAWL_MAX_PAGES)
+    max_depth = min(data.max_depth if data.max_depth is not None else crawler.CRAWL_MAX_DEPTH, crawler.CRAWL_MAX_DEPTH)
+    await log_analytics("crawl_started", {"url": data.url})
+    return crawler.start_crawl(data.url, max_pages=max_pages, max_depth=max_depth)
+
+
+@app.get("/api/crawl/{crawl_id}")
+async def crawl_status(crawl_id: str):
+    progress = crawler.crawl_progress(crawl_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Crawl not found")
+    return progress
+
+
+@app.get("/api/crawl/{crawl_id}/pages")
+async def crawl_pages(crawl_id: str, offset: int = 0, limit: int = 100):
+    state = crawler.get_crawl(crawl_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Crawl not found")
+    return {"total": len(state.pages), "pages": state.pages[offset:offset + min(limit, 1000)]}
+
+
+@app.post("/api/crawl/{crawl_id}/pause")
+async def pause_crawl(crawl_id: str):
+    progress = await crawler.pause_crawl(crawl_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Crawl not found")
+    return progress
+
+
+@app.post("/api/crawl/{crawl_id}/resume")
+async def resume_crawl(crawl_id: str):
+    progress = crawler.resume_crawl(crawl_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Crawl not found")
+    return progress
+
+
+async def submit_job(kind, url):
+    try:
+        job = await job_queue.submit(kind, url)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await log_analytics("job_submitted", {"kind": kind, "url": url})
+    return JSONResponse(job_status(job), status_code=202)
+
+
+@app.post("/api/jobs")
+async def create_job(data: JobRequest):
+    """Queue an audit or PDF export; poll GET /api/jobs/{id} until it is done"""
+    return await submit_job(data.kind, data.url)
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job_status(job)
+
+
+@app.get("/api/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    headers = {"Content-Disposition": "attachment; filename=audit.pdf"} if job.kind == "pdf" else {}
+    return Response(job.result, media_type=job.media_type, headers=headers)
+
+
+@app.post("/api/schedules")
+async def add_schedule(data: ScheduleRequest):
+    """Audit a URL every interval_hours (weekly by default), starting at a jittered time"""
+    if not data.url.startswith(("http://", "https://")):
+        raise HTTPException(status_code=400, detail="url must be an absolute http(s) URL")
+    if data.plan not in PLANS:
+        raise HTTPException(status_code=400, detail=f"plan must be one of {', '.join(PLANS)}")
+    try:
+        s = await asyncio.to_thread(create_schedule, data.url, int(data.interval_hours * 3600), data.plan, data.user_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await log_analytics("schedule_created", {"url": data.url})
+    return JSONResponse(schedule_status(s), status_code=201)
+
+
+@app.get("/api/schedules")
+async def get_schedules(offset: int = 0, limit: int = 100):
+    schedules = await list_schedules(offset, min(limit, 1000))
+    return {"schedules": [schedule_status(s) for s in schedules], "scheduler": scheduler.stats}
+
+
+@app.get("/api/schedules/{schedule_id}")
+async def get_schedule_endpoint(schedule_id: str):
+    s = await get_schedule(schedule_id)
+    if s is None:
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return schedule_status(s)
+
+
+@app.delete("/api/schedules/{schedule_id}")
+async def delete_schedule_endpoint(schedule_id: str):
+    if not await asyncio.to_thread(delete_schedule, schedule_id):
+        raise HTTPException(status_code=404, detail="Schedule not found")
+    return {"deleted": schedule_id}
+
+
+@app.get("/api/history/trend")
+async def history_trend(url: str = "", site: str = "", days: int = Query(90, ge=1, le=3650)):
+    """Score trend: every audit of ?url=, or daily averages for ?site="""
+    import history
+
+    if bool(url) == bool(site):
+        raise HTTPException(status_code=400, detail="Provide exactly one of 'url' or 'site'")
+    if url:
+        return {"url": url, "days": days, "audits": await asyncio.to_thread(history.url_trend, url, days)}
+    return {"site": site, "days": days, "daily": await asyncio.to_thread(history.site_trend, site, days)}
+
+
+@app.get("/api/history/issues")
+async def history_issues(site: str = "", days: int = Query(90, ge=1, le=3650)):
+    """Issue counts by rule code over the last ?days, for one ?site or all audits"""
+    import history
+
+    return {"site": site or None, "days": days, "issues": await asyncio.to_thread(history.issue_counts, site or None, days)}
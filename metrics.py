@@ -0,0 +1,164 @@
+"""In-process latency histograms and counters, exposed as Prometheus text on /metrics.
+
+Hot paths time themselves with ``timer(stage)`` (or ``observe`` for a
+duration they already have) and count with ``inc``. Recording is a dict
+lookup, a bisect and a few additions under one lock. Stages run in executor
+worker processes are recorded there and merged back with the stage result
+(see executor.py), so worker-side timings show up in the parent's /metrics.
+
+Stage histograms (``rankypulse_stage_seconds{stage=...}``):
+fetch_dns, fetch_connect, fetch_ttfb, fetch_download, decode, parse, score,
+keywords and pdf.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+PREFIX = "rankypulse_"
+# seconds; fetches and parses of large pages land in the upper buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "stage_seconds": "Time spent in each audit pipeline stage.",
+    "executor_wait_seconds": "Time a stage waited for a stage executor worker.",
+    "executor_run_seconds": "Time a stage ran in the stage executor, including transfer.",
+    "fetch_bytes_total": "Response body bytes downloaded.",
+    "fetch_responses_total": "Fetched responses by status class.",
+    "fetch_errors_total": "Fetches that failed before a response, by error type.",
+    "pipeline_events_total": "Page cache and audit pipeline events (see /api/pipeline/stats).",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+_lock = threading.Lock()
+_histograms: Dict[Tuple[str, Labels], Histogram] = {}
+_counters: Dict[Tuple[str, Labels], float] = {}
+_collectors: List[Callable[[], Dict[Tuple[str, Labels], float]]] = []
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram()
+        h.counts[bisect_left(BUCKETS, seconds)] += 1
+        h.sum += seconds
+        h.count += 1
+
+
+def inc(name: str, value: float = 1, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(labels.items()))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+class timer:
+    """``with timer("parse"):`` observes the block's duration as a pipeline stage."""
+
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe("stage_seconds", time.perf_counter() - self.start, stage=self.stage)
+
+
+def add_collector(fn: Callable[[], Dict[Tuple[str, Labels], float]]) -> None:
+    """Register a callable returning ``{(counter name, labels): value}`` read at scrape time."""
+    _collectors.append(fn)
+
+
+def drain() -> Optional[tuple]:
+    """Take and reset everything recorded in this process, for ``merge`` in another."""
+    with _lock:
+        if not _histograms and not _counters:
+            return None
+        histograms = {k: (h.counts, h.sum, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+        _histograms.clear()
+        _counters.clear()
+    return histograms, counters
+
+
+def merge(snapshot: Optional[tuple]) -> None:
+    if not snapshot or not METRICS_ENABLED:
+        return
+    histograms, counters = snapshot
+    with _lock:
+        for key, (counts, total, count) in histograms.items():
+            h = _histograms.get(key)
+            if h is None:
+                h = _histograms[key] = Histogram()
+            h.counts = [a + b for a, b in zip(h.counts, counts)]
+            h.sum += total
+            h.count += count
+        for key, value in counters.items():
+            _counters[key] = _counters.get(key, 0) + value
+
+
+def _labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _le(bound) -> str:
+    return f'le="{bound}"'
+
+
+def _header(lines: List[str], name: str, kind: str) -> None:
+    lines.append(f"# HELP {PREFIX}{name} {HELP.get(name, name)}")
+    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+
+def render() -> str:
+    """Everything recorded so far in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: (list(h.counts), h.sum, h.count) for k, h in _histograms.items()}
+        counters = dict(_counters)
+    for collect in _collectors:
+        counters.update(collect())
+
+    lines: List[str] = []
+    seen = set()
+    for (name, labels), (counts, total, count) in sorted(histograms.items()):
+        if name not in seen:
+            seen.add(name)
+            _header(lines, name, "histogram")
+        cumulative = 0
+        for bound, n in zip(BUCKETS, counts):
+            cumulative += n
+            lines.append(f"{PREFIX}{name}_bucket{_labels(labels, _le(bound))} {cumulative}")
+        lines.append(f"{PREFIX}{name}_bucket{_labels(labels, _le('+Inf'))} {count}")
+        lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total:.6f}")
+        lines.append(f"{PREFIX}{name}_count{_labels(labels)} {count}")
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            seen.add(name)
+            _header(lines, name, "counter")
+        lines.append(f"{PREFIX}{name}{_labels(labels)} {int(value) if value == int(value) else value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,224 @@
+"""HTML parser backends that build a PageModel in a single document walk.
+
+The fastest installed backend is used: selectolax (lexbor), then lxml, then
+BeautifulSoup with the pure-Python html.parser. Set HTML_PARSER to force one.
+"""
+import os
+from typing import Dict, List, Optional
+
+from analysis import HEADING_TAGS, SKIP_TAGS, PageModel, finish_page
+from metrics import timer
+
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+
+class ParserBackend:
+    name = ""
+
+    def parse(self, html: str) -> PageModel:
+        raise NotImplementedError
+
+
+def _record_meta(page: PageModel, attrs) -> None:
+    meta_name = (attrs.get("name") or "").lower()
+    if meta_name == "description" and page.meta_description is None:
+        page.meta_description = attrs.get("content") or ""
+    elif meta_name == "robots" and page.robots is None:
+        page.robots = attrs.get("content") or ""
+
+
+def _record_link(page: PageModel, attrs) -> None:
+    if page.canonical is None and "canonical" in (attrs.get("rel") or "").lower().split():
+        page.canonical = attrs.get("href") or ""
+
+
+def _join_text(strings) -> str:
+    return " ".join(s.strip() for s in strings if s and s.strip())
+
+
+class HtmlParserBackend(ParserBackend):
+    name = "html.parser"
+
+    def __init__(self):
+        from bs4 import BeautifulSoup, CData, NavigableString, Tag
+        self._soup, self._text_types, self._tag = BeautifulSoup, (NavigableString, CData), Tag
+
+    def parse(self, html: str) -> PageModel:
+        soup = self._soup(html, "html.parser")
+        page, pieces, seen_title = PageModel(), [], False
+        stack = [iter(soup.children)]
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                continue
+            if isinstance(node, self._tag):
+                name = node.name
+                if name == "title" and not seen_title:
+                    page.title, seen_title = node.get_text().strip(), True
+                elif name == "meta":
+                    _record_meta(page, node.attrs)
+                elif name == "link":
+                    _record_link(page, {**node.attrs, "rel": " ".join(node.get("rel") or [])})
+                elif name in HEADING_TAGS:
+                    page.headings.setdefault(name, []).append(node.get_text(" ", strip=True))
+                elif name == "a" and node.get("href"):
+                    page.links.append(node["href"])
+                if name not in SKIP_TAGS:
+                    stack.append(iter(node.children))
+            elif type(node) in self._text_types:
+                piece = node.strip()
+                if piece:
+                    pieces.append(piece)
+        return finish_page(page, pieces)
+
+
+class LxmlBackend(ParserBackend):
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.etree
+        import lxml.html
+        self._etree, self._html = lxml.etree, lxml.html
+
+    def _heading_text(self, el) -> str:
+        strings = []
+        walker = self._etree.iterwalk(el, events=("start", "end", "comment", "pi"))
+        for event, child in walker:
+            if event != "start":
+                if child is not el:
+                    strings.append(child.tail)
+            elif child.tag in SKIP_TAGS:
+                walker.skip_subtree()
+            else:
+                strings.append(child.text)
+        return _join_text(strings)
+
+    def parse(self, html: str) -> PageModel:
+        page, pieces, seen_title = PageModel(), [], False
+        try:
+            try:
+                root = self._html.document_fromstring(html)
+            except ValueError:
+                # str input carrying an XML encoding declaration
+                root = self._html.document_fromstring(html.encode("utf-8"))
+        except self._etree.ParserError:
+            return finish_page(page, pieces)
+        walker = self._etree.iterwalk(root, events=("start", "end", "comment", "pi"))
+        for event, el in walker:
+            tag = el.tag
+            if event in ("end", "comment", "pi"):
+                # comments and processing instructions only contribute their tail
+                if el.tail and el.tail.strip():
+                    pieces.append(el.tail.strip())
+                continue
+            if tag == "title" and not seen_title:
+                page.title, seen_title = (el.text_content() or "").strip(), True
+            elif tag == "meta":
+                _record_meta(page, el.attrib)
+            elif tag == "link":
+                _record_link(page, el.attrib)
+            elif tag in HEADING_TAGS:
+                page.headings.setdefault(tag, []).append(self._heading_text(el))
+            elif tag == "a" and el.get("href"):
+                page.links.append(el.get("href"))
+            if tag in SKIP_TAGS:
+                walker.skip_subtree()
+            elif el.text and el.text.strip():
+                pieces.append(el.text.strip())
+        return finish_page(page, pieces)
+
+
+class SelectolaxBackend(ParserBackend):
+    name = "selectolax"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+        self._parser = LexborHTMLParser
+
+    def parse(self, html: str) -> PageModel:
+        tree = self._parser(html)
+        page, pieces, seen_title = PageModel(), [], False
+        if tree.root is None:
+            return finish_page(page, pieces)
+        for node in tree.root.traverse(include_text=True):
+            tag = node.tag
+            if tag == "-text":
+                parent = node.parent
+                if parent is not None and parent.tag in SKIP_TAGS:
+                    continue
+                piece = (node.text_content or "").strip()
+                if piece:
+                    pieces.append(piece)
+            elif tag == "title" and not seen_title:
+                page.title, seen_title = node.text(deep=True).strip(), True
+            elif tag == "meta":
+                _record_meta(page, node.attributes)
+            elif tag == "link":
+                _record_link(page, node.attributes)
+            elif tag in HEADING_TAGS:
+                page.headings.setdefault(tag, []).append(_join_text(
+                    n.text_content for n in node.traverse(include_text=True)
+                    if n.tag == "-text" and n.parent.tag not in SKIP_TAGS
+                ))
+            elif tag == "a" and node.attributes.get("href"):
+                page.links.append(node.attributes["href"])
+        return finish_page(page, pieces)
+
+
+BACKENDS = {b.name: b for b in (SelectolaxBackend, LxmlBackend, HtmlParserBackend)}
+_instances: Dict[str, ParserBackend] = {}
+_auto: Optional[ParserBackend] = None
+
+
+def _load(name: str) -> ParserBackend:
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def available_backends() -> List[str]:
+    names = []
+    for name in BACKENDS:
+        try:
+            _load(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def get_parser(name: Optional[str] = None) -> ParserBackend:
+    """Return the named backend, or the fastest installed one for ``auto``."""
+    global _auto
+    name = name or HTML_PARSER
+    if name != "auto":
+        return _load(name)
+    if _auto is None:
+        _auto = _load(available_backends()[0])
+    return _auto
+
+
+def parse_page(html: str, backend: Optional[str] = None) -> PageModel:
+    return get_parser(backend).parse(html)
+
+
+def decode_body(body: bytes, encoding: str = "utf-8") -> str:
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        return body.decode("utf-8", errors="replace")
+
+
+def parse_body(body: bytes, encoding: str = "utf-8") -> PageModel:
+    """Decode and parse a response body, keeping only what the endpoints read.
+
+    This is the executor's parse stage, so the raw text is dropped before the
+    model is sent back from a worker process.
+    """
+    with timer("decode"):
+        html = decode_body(body, encoding)
+    with timer("parse"):
+        page = parse_page(html)
+    page.text = ""
+    return page
@@ -0,0 +1,339 @@
+"""Fetch-and-parse pipeline shared by the URL-taking endpoints.
+
+Audits go through audit_page, which keeps each URL's last audit in the
+AuditState table and skips parsing and scoring when the page is unchanged,
+and adds every audit to the history (history.py).
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Optional, Tuple
+
+from analysis import PageModel, build_audit, page_terms
+from cache import CACHE_TTL, CacheEntry, make_cache, normalize_url
+from fetcher import FETCH_MAX_BYTES, FetchError, FetchResult, iter_body, stream_page, to_result
+from executor import EXECUTOR_INLINE_BYTES, executor
+from df_index import document_frequency
+import metrics
+from parsers import parse_body
+from rules import DEFAULT_PLAN
+from singleflight import SingleFlight
+from streaming import STREAM_ANALYSIS, STREAM_MAX_BYTES, STREAM_THRESHOLD_BYTES, analyze_stream
+
+if TYPE_CHECKING:
+    from db import AuditState
+
+# a large body re-checked against a known hash is kept in memory up to this size, then on disk
+SPOOL_BYTES = 8 * 1024 * 1024
+SPOOL_CHUNK = 64 * 1024
+
+# reports reuse a stored audit checked within this many seconds
+REPORT_MAX_AGE = int(os.getenv("REPORT_MAX_AGE", "86400"))
+
+page_cache = make_cache()
+flights = SingleFlight()
+stats = {
+    "hits": 0, "misses": 0, "coalesced": 0, "revalidated": 0, "unchanged": 0,
+    "streamed": 0, "head_only": 0, "audits": 0, "audits_skipped": 0,
+}
+
+
+metrics.add_collector(lambda: {("pipeline_events_total", (("event", k),)): v for k, v in stats.items()})
+
+
+def content_hash(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def pipeline_stats() -> Dict[str, int]:
+    return {**stats, "in_flight": len(flights), "executor": executor.stats()}
+
+
+async def _chain(parts, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    for part in parts:
+        yield part
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _replay(spool) -> AsyncIterator[bytes]:
+    spool.seek(0)
+    while True:
+        chunk = await asyncio.to_thread(spool.read, SPOOL_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def _spool_and_hash(chunks: AsyncIterator[bytes], max_bytes: int = STREAM_MAX_BYTES):
+    """Hash and spool the first ``max_bytes`` of ``chunks``; returns (spool, digest, truncated)."""
+    spool = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    hasher = hashlib.blake2b(digest_size=16)
+    size, truncated = 0, False
+    async for chunk in chunks:
+        if size + len(chunk) > max_bytes:
+            chunk, truncated = chunk[: max_bytes - size], True
+        size += len(chunk)
+        hasher.update(chunk)
+        spool.write(chunk)
+        if truncated:
+            break
+    return spool, hasher.hexdigest(), truncated
+
+
+def _conditional(headers: Dict[str, str], etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    request_headers = dict(headers)
+    if etag:
+        request_headers["If-None-Match"] = etag
+    if last_modified:
+        request_headers["If-Modified-Since"] = last_modified
+    return request_headers
+
+
+async def _read_and_parse(resp, known_hash: Optional[str] = None) -> Tuple[FetchResult, Optional[PageModel], str]:
+    """Buffer and parse the body, switching to streaming analysis once it gets large.
+
+    The page is None when the body hashes to ``known_hash``, so the caller
+    can reuse what it already has without parsing. A large body checked
+    against ``known_hash`` is spooled while it is hashed and only streamed
+    through the analyzer when it changed.
+    """
+    limit = STREAM_THRESHOLD_BYTES if STREAM_ANALYSIS else FETCH_MAX_BYTES
+    chunks, parts, size = iter_body(resp), [], 0
+    async for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if size > limit:
+            break
+
+    if size > limit and STREAM_ANALYSIS and known_hash is not None:
+        # hash the whole body before parsing any of it, so an unchanged page is never parsed
+        spool, digest, truncated = await _spool_and_hash(_chain(parts, chunks))
+        with spool:
+            if digest == known_hash:
+                return to_result(resp, truncated=truncated), None, digest
+            stats["streamed"] += 1
+            result = await analyze_stream(_replay(spool), resp.charset or "utf-8")
+        return to_result(resp, truncated=result.truncated), result.page, digest
+
+    if size > limit and STREAM_ANALYSIS:
+        stats["streamed"] += 1
+        hasher = hashlib.blake2b(digest_size=16)
+        result = await analyze_stream(_chain(parts, chunks), resp.charset or "utf-8", hasher=hasher)
+        return to_result(resp, truncated=result.truncated), result.page, hasher.hexdigest()
+
+    body = b"".join(parts)
+    r = to_result(resp, body[:limit], truncated=size > limit)
+    digest = content_hash(r.body)
+    if digest == known_hash:
+        return r, None, digest
+    page = await executor.run("parse", parse_body, r.body, r.encoding, inline=len(r.body) < EXECUTOR_INLINE_BYTES)
+    return r, page, digest
+
+
+def _count_document(key: str, digest: str, page: PageModel) -> None:
+    """Count ``page`` in the document frequencies, compacting the index when it is due.
+
+    Called in a worker thread: collecting the terms of a large page alone
+    takes tens of milliseconds.
+    """
+    document_frequency.set_document(key, digest, set(page_terms(page)))
+    if document_frequency.needs_compaction():
+        document_frequency.compact()
+
+
+async def _store_page(key: str, r: FetchResult, page: PageModel, digest: str, parsed: bool) -> None:
+    """Cache a 200 page and count a newly parsed one in the keyword document frequencies.
+
+    Frequencies are keyed by URL and content hash, so re-parsing a page counts
+    it once and a changed page replaces its previous terms.
+    """
+    if r.status != 200:
+        return
+    if parsed:
+        await asyncio.to_thread(_count_document, key, digest, page)
+    await page_cache.set(key, CacheEntry(
+        url=key,
+        page=page,
+        content_hash=digest,
+        etag=r.headers.get("etag"),
+        last_modified=r.headers.get("last-modified"),
+        expires_at=time.time() + CACHE_TTL,
+    ))
+
+
+async def _fetch_and_parse(
+    key: str, url: str, headers: Dict[str, str], entry: Optional[CacheEntry]
+) -> Tuple[FetchResult, PageModel]:
+    request_headers = headers if entry is None else _conditional(headers, entry.etag, entry.last_modified)
+    async with stream_page(url, headers=request_headers) as resp:
+        if resp.status == 304 and entry is not None:
+            stats["revalidated"] += 1
+            entry.expires_at = time.time() + CACHE_TTL
+            await page_cache.set(key, entry)
+            return to_result(resp), entry.page
+        r, page, digest = await _read_and_parse(resp, entry.content_hash if entry is not None else None)
+
+    parsed = page is not None
+    if not parsed:
+        stats["unchanged"] += 1
+        page = entry.page
+    await _store_page(key, r, page, digest, parsed)
+    return r, page
+
+
+async def load_page(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    raise_for_status: bool = False,
+) -> PageModel:
+    """Return the parsed page for ``url``, from cache when fresh or still valid.
+
+    Concurrent loads of the same normalized URL share one fetch-and-parse.
+    """
+    key = normalize_url(url)
+    entry = await page_cache.get(key)
+    if entry is not None and entry.fresh:
+        stats["hits"] += 1
+        return entry.page
+
+    coalesced = key in flights
+    r, page = await flights.do(key, lambda: _fetch_and_parse(key, url, headers or {}, entry))
+    stats["coalesced" if coalesced else "misses"] += 1
+    if raise_for_status and r.status >= 400:
+        raise FetchError(f"{r.status} {r.reason} for url: {r.url}")
+    return page
+
+
+async def load_head(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    raise_for_status: bool = False,
+) -> PageModel:
+    """Return a page with only its <head> fields filled in, for head-only checks.
+
+    The download stops as soon as the head has been parsed. Head-only pages
+    are not cached, but a fresh full page from the cache is returned as is.
+    """
+    entry = await page_cache.get(normalize_url(url))
+    if entry is not None and entry.fresh:
+        stats["hits"] += 1
+        return entry.page
+    async with stream_page(url, headers=headers, raise_for_status=raise_for_status) as resp:
+        result = await analyze_stream(iter_body(resp), resp.charset or "utf-8", head_only=True)
+    stats["head_only"] += 1
+    return result.page
+
+
+# db and history pull in SQLAlchemy, which is slow to import; they are loaded on first use
+
+def _load_audit_state(key: str) -> Optional["AuditState"]:
+    from sqlmodel import Session
+    from db import AuditState, engine
+
+    with Session(engine) as session:
+        return session.get(AuditState, key)
+
+
+def _save_audit_state(state: "AuditState") -> None:
+    from sqlmodel import Session
+    from db import engine
+
+    with Session(engine) as session:
+        session.merge(state)
+        session.commit()
+
+
+async def _audit(key: str, url: str, headers: Dict[str, str], plan: str) -> Tuple[dict, bool]:
+    from history import record_audit
+
+    start = time.time()
+    audit, skipped = await _audit_or_reuse(key, url, headers, plan)
+    await asyncio.to_thread(record_audit, url, audit, (time.time() - start) * 1000, skipped)
+    return audit, skipped
+
+
+async def _audit_or_reuse(key: str, url: str, headers: Dict[str, str], plan: str) -> Tuple[dict, bool]:
+    state = await asyncio.to_thread(_load_audit_state, key)
+    if state is not None and state.plan != plan:
+        state = None
+    now = datetime.utcnow()
+
+    entry = await page_cache.get(key)
+    if entry is not None and entry.fresh:
+        r, page, digest = None, entry.page, entry.content_hash
+        if state is not None and digest == state.content_hash:
+            page = None
+    else:
+        request_headers = headers if state is None else _conditional(headers, state.etag, state.last_modified)
+        async with stream_page(url, headers=request_headers) as resp:
+            if resp.status == 304 and state is not None:
+                r, page, digest = to_result(resp), None, state.content_hash
+            else:
+                r, page, digest = await _read_and_parse(resp, state.content_hash if state is not None else None)
+
+    if page is None:
+        stats["audits_skipped"] += 1
+        state.checked_at = now
+        if r is not None and r.status == 200:
+            state.etag = r.headers.get("etag") or state.etag
+            state.last_modified = r.headers.get("last-modified") or state.last_modified
+        await asyncio.to_thread(_save_audit_state, state)
+        return json.loads(state.result), True
+
+    if r is not None:
+        await _store_page(key, r, page, digest, parsed=True)
+    # keyword scoring reads the on-disk document frequencies
+    audit = await asyncio.to_thread(build_audit, url, page, plan)
+    stats["audits"] += 1
+    if r is None or r.status == 200:
+        from db import AuditState
+
+        await asyncio.to_thread(_save_audit_state, AuditState(
+            url=key,
+            plan=plan,
+            content_hash=digest,
+            etag=entry.etag if r is None else r.headers.get("etag"),
+            last_modified=entry.last_modified if r is None else r.headers.get("last-modified"),
+            result=json.dumps(audit),
+            audited_at=now,
+            checked_at=now,
+        ))
+    return audit, False
+
+
+async def stored_audit(url: str, plan: str = DEFAULT_PLAN, max_age: Optional[float] = None) -> Optional[dict]:
+    """The last stored audit of ``url``, if it was checked within ``max_age`` seconds."""
+    state = await asyncio.to_thread(_load_audit_state, normalize_url(url))
+    if state is None or state.plan != plan:
+        return None
+    if max_age is not None and (datetime.utcnow() - state.checked_at).total_seconds() > max_age:
+        return None
+    return json.loads(state.result)
+
+
+async def audit_page(
+    url: str,
+    headers: Optional[Dict[str, str]] = None,
+    plan: str = DEFAULT_PLAN,
+) -> Tuple[dict, bool]:
+    """Audit ``url``, reusing its stored audit when the page has not changed.
+
+    Re-audits send the stored ETag/Last-Modified; a 304, or a body with the
+    stored content hash, returns the stored audit without parsing. Returns
+    the audit and whether it was skipped.
+    """
+    key = normalize_url(url)
+    return await flights.do(("audit", key, plan), lambda: _audit(key, url, headers or {}, plan))
+
+
+async def report_audit(url: str, headers: Optional[Dict[str, str]] = None, fresh: bool = False) -> dict:
+    """The audit a report of ``url`` is rendered from: a recent stored one, else a new audit_page run."""
+    audit = None if fresh else await stored_audit(url, max_age=REPORT_MAX_AGE)
+    if audit is None:
+        audit, _ = await audit_page(url, headers=headers)
+    return {**audit, "url": url}
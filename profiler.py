@@ -0,0 +1,233 @@
+"""Opt-in sampling profiler for slow requests.
+
+With PROFILER_ENABLED=1, ProfilerMiddleware tracks in-flight HTTP requests
+and a background thread samples the ones that have run longer than
+PROFILE_THRESHOLD_MS, plus a PROFILE_SAMPLE_RATE fraction picked at random
+when they start. Every PROFILE_INTERVAL_MS it records, for each of them,
+either the event loop thread's stack (when one of the request's tasks is
+running) or the chain of coroutines the request is awaiting. Finished
+profiles go to a ring buffer of the last PROFILE_BUFFER, labelled by route,
+and are read in collapsed-stack format (flamegraph.pl, speedscope) from
+/api/admin/profiles with the PROFILER_TOKEN.
+
+While no request is eligible the thread sleeps until the earliest one
+could become slow, so requests only pay for a dict insert and a context
+variable.
+"""
+import asyncio
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "0") == "1"
+PROFILER_TOKEN = os.getenv("PROFILER_TOKEN", "")
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "2000"))
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_BUFFER = int(os.getenv("PROFILE_BUFFER", "50"))
+MAX_DEPTH = 128
+
+_request: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("profiled_request", default=None)
+_owners: "weakref.WeakKeyDictionary[asyncio.Task, RequestProfile]" = weakref.WeakKeyDictionary()
+_ids = itertools.count(1)
+
+
+class RequestProfile:
+    __slots__ = ("id", "method", "path", "endpoint", "task", "start", "wall_start", "picked", "stacks", "duration_ms")
+
+    def __init__(self, method: str, path: str, task: Optional[asyncio.Task], picked: bool):
+        self.id = next(_ids)
+        self.method = method
+        self.path = path
+        self.endpoint = path
+        self.task = task
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.picked = picked
+        self.stacks: Counter = Counter()
+        self.duration_ms = 0.0
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "endpoint": self.endpoint,
+            "method": self.method,
+            "path": self.path,
+            "started_at": round(self.wall_start, 3),
+            "duration_ms": round(self.duration_ms, 1),
+            "reason": "sampled" if self.picked else "slow",
+            "samples": sum(self.stacks.values()),
+        }
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return names[::-1]
+
+
+def _await_stack(task: asyncio.Task) -> List[str]:
+    """Frames of the coroutines ``task`` is suspended in, outermost first."""
+    names: List[str] = ["(awaiting)"]
+    coro = task.get_coro()
+    while coro is not None and len(names) < MAX_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "ag_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        names.append(_frame_name(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "ag_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return names
+
+
+def _task_factory(loop, coro, **kwargs):
+    """Create tasks as usual, remembering which profiled request spawned them."""
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    owner = _request.get()
+    if owner is not None:
+        _owners[task] = owner
+    return task
+
+
+class Sampler:
+    def __init__(self):
+        self.active: Dict[int, RequestProfile] = {}
+        self.profiles: Deque[RequestProfile] = deque(maxlen=PROFILE_BUFFER)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread = 0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start sampling ``loop`` (called from the loop thread on the first request)."""
+        self.loop, self._loop_thread = loop, threading.get_ident()
+        if loop.get_task_factory() is None:
+            loop.set_task_factory(_task_factory)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+
+    def begin(self, profile: RequestProfile) -> None:
+        self.active[profile.id] = profile
+        if profile.task is not None:
+            _owners[profile.task] = profile
+        self._wake.set()
+
+    def end(self, profile: RequestProfile) -> None:
+        self.active.pop(profile.id, None)
+        profile.duration_ms = (time.perf_counter() - profile.start) * 1000
+        profile.task = None
+        if profile.stacks:
+            self.profiles.append(profile)
+
+    def _run(self) -> None:
+        threshold, interval = PROFILE_THRESHOLD_MS / 1000, PROFILE_INTERVAL_MS / 1000
+        while True:
+            now = time.perf_counter()
+            active = list(self.active.values())
+            eligible = [p for p in active if p.picked or now - p.start >= threshold]
+            if not eligible:
+                timeout = min(p.start + threshold for p in active) - now if active else None
+                self._wake.wait(timeout)
+                self._wake.clear()
+                continue
+            self._sample(eligible)
+            time.sleep(interval)
+
+    def _sample(self, eligible: List[RequestProfile]) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        running = asyncio.current_task(self.loop)
+        owner = _owners.get(running) if running is not None else None
+        for profile in eligible:
+            try:
+                if profile is owner:
+                    stack = _thread_stack(frame)
+                elif profile.task is not None:
+                    stack = _await_stack(profile.task)
+                else:
+                    continue
+            except Exception:
+                # the loop moved on while we were walking its frames
+                continue
+            profile.stacks[";".join(stack)] += 1
+
+
+sampler = Sampler()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware registering each HTTP request with the sampler."""
+
+    def __init__(self, app):
+        self.app = app
+        self._routes: Dict[object, str] = {}
+
+    def _endpoint(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return scope["path"]
+        if endpoint not in self._routes:
+            for route in getattr(scope.get("app"), "routes", []):
+                if getattr(route, "endpoint", None) is endpoint:
+                    self._routes[endpoint] = route.path
+                    break
+            else:
+                self._routes[endpoint] = scope["path"]
+        return self._routes[endpoint]
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if sampler.loop is None:
+            sampler.attach(asyncio.get_running_loop())
+        picked = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        profile = RequestProfile(scope["method"], scope["path"], asyncio.current_task(), picked)
+        token = _request.set(profile)
+        sampler.begin(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile.endpoint = self._endpoint(scope)
+            sampler.end(profile)
+            _request.reset(token)
+
+
+def authorized(token: str) -> bool:
+    return bool(PROFILER_TOKEN) and hmac.compare_digest(token.encode(), PROFILER_TOKEN.encode())
+
+
+def list_profiles(endpoint: Optional[str] = None) -> List[dict]:
+    """Summaries of the buffered profiles, newest first."""
+    return [p.summary() for p in reversed(sampler.profiles) if endpoint is None or p.endpoint == endpoint]
+
+
+def collapsed(profile_id: Optional[int] = None, endpoint: Optional[str] = None) -> Optional[str]:
+    """Collapsed stacks of one profile, or merged over an endpoint's (all when neither is given).
+
+    Each stack starts with the endpoint, so merged output splits by route in a flame graph.
+    """
+    profiles = [
+        p for p in list(sampler.profiles)
+        if (profile_id is None or p.id == profile_id) and (endpoint is None or p.endpoint == endpoint)
+    ]
+    if profile_id is not None and not profiles:
+        return None
+    stacks: Counter = Counter()
+    for p in profiles:
+        for stack, n in p.stacks.items():
+            stacks[f"{p.method} {p.endpoint};{stack}"] += n
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
@@ -0,0 +1,122 @@
+"""PDF audit report rendering.
+
+Styles are built once per process (``warm_up`` at startup, or on first use in
+a stage executor worker) instead of on every render. Single-page reports
+render from an audit result dict; site reports draw rows straight onto a
+canvas as they come from an iterator, so the page data is never held as a
+whole, and are written to a spooled file that is streamed back in chunks.
+"""
+from functools import lru_cache
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterable, Iterator, List
+
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from metrics import timer
+
+CHUNK_SIZE = 64 * 1024
+SPOOL_BYTES = 1024 * 1024  # site reports spill to disk beyond this
+ROW_HEIGHT = 14
+MARGIN = 0.75 * inch
+
+
+@lru_cache(maxsize=None)
+def styles():
+    sheet = getSampleStyleSheet()
+    return {
+        "title": sheet["Heading1"],
+        "heading": sheet["Heading2"],
+        "normal": sheet["Normal"],
+        "issue": ParagraphStyle("Issue", parent=sheet["Normal"], leftIndent=12, spaceAfter=2),
+    }
+
+
+def warm_up() -> None:
+    styles()
+
+
+def _story(url: str, s: int, i, keywords: List[str]) -> list:
+    st = styles()
+    story = [Paragraph("SEO Audit", st["title"]), Spacer(1, 0.2*inch), Paragraph(f"URL: {url}", st["normal"]), Paragraph(f"Score: {s}/100", st["normal"]), Spacer(1, 0.2*inch), Paragraph("Issues:", st["heading"])]
+    for issue in i:
+        story.append(Paragraph(f"• {issue['sev']}: {issue['msg']}", st["issue"]))
+    if keywords:
+        story += [Spacer(1, 0.2*inch), Paragraph("Keywords:", st["heading"]), Paragraph(", ".join(keywords), st["normal"])]
+    return story
+
+
+def render_pdf(url: str, s: int, i, keywords: List[str] = ()) -> bytes:
+    buf = BytesIO()
+    with timer("pdf"):
+        SimpleDocTemplate(buf, pagesize=letter).build(_story(url, s, i, list(keywords)))
+    return buf.getvalue()
+
+
+def render_audit_pdf(audit: dict) -> bytes:
+    """Render a stored build_audit payload without touching the page again."""
+    return render_pdf(audit["url"], audit["overview"]["score"], audit["issues"], audit.get("keywords", []))
+
+
+def render_site_report(site: str, rows: Iterable[dict], out: IO[bytes]) -> int:
+    """Draw one line per page (``url``, ``score``, ``issues``) onto ``out``; returns the row count."""
+    c = canvas.Canvas(out, pagesize=letter)
+    _, height = letter
+    y, count, total = 0.0, 0, 0
+
+    def new_page(first: bool = False):
+        nonlocal y
+        if not first:
+            c.showPage()
+        c.setFont("Helvetica-Bold", 16 if first else 10)
+        c.drawString(MARGIN, height - MARGIN, f"Site report: {site}")
+        c.setFont("Helvetica", 9)
+        y = height - MARGIN - 2 * ROW_HEIGHT
+
+    new_page(first=True)
+    for row in rows:
+        if y < MARGIN:
+            new_page()
+        c.drawString(MARGIN, y, f"{row['score']:>3}")
+        c.drawString(MARGIN + 0.4 * inch, y, row["url"][:90])
+        if row["issues"]:
+            c.drawString(MARGIN + 5.4 * inch, y, ", ".join(row["issues"])[:40])
+        y -= ROW_HEIGHT
+        count += 1
+        total += row["score"]
+    if y < MARGIN + 2 * ROW_HEIGHT:
+        new_page()
+    c.setFont("Helvetica-Bold", 10)
+    avg = f"{total / count:.1f}" if count else "-"
+    c.drawString(MARGIN, y - ROW_HEIGHT, f"{count} pages, average score {avg}")
+    c.save()
+    return count
+
+
+def spooled_site_report(site: str, rows: Iterable[dict]) -> IO[bytes]:
+    """Render a site report into a spooled temp file, rewound for reading."""
+    out = SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    with timer("pdf"):
+        render_site_report(site, rows, out)
+    out.seek(0)
+    return out
+
+
+def iter_chunks(data, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield ``data`` (bytes or a readable file, closed at the end) in chunks."""
+    if isinstance(data, (bytes, bytearray)):
+        for i in range(0, len(data), chunk_size):
+            yield data[i:i + chunk_size]
+        return
+    try:
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        data.close()
@@ -0,0 +1,137 @@
+"""Conditional JSON responses and response compression.
+
+``conditional_json`` serializes a result once, tags it with an ETag derived
+from the bytes and answers a matching If-None-Match with 304 Not Modified.
+The ETag is weak because CompressionMiddleware may re-encode the body.
+
+CompressionMiddleware compresses complete (non-streaming) text and JSON
+bodies of at least COMPRESS_MIN_BYTES with brotli, when the ``brotli``
+package is installed and the client accepts it, or gzip. Streaming responses
+(NDJSON batches, PDFs, CSV exports) are passed through untouched so they
+still arrive incrementally.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+from typing import Optional, Set
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+# bodies larger than this are compressed in a worker thread
+COMPRESS_THREAD_BYTES = 256 * 1024
+COMPRESSIBLE = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+
+def etag_for(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of ``etag`` against an If-None-Match header."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque:
+            return True
+    return False
+
+
+def conditional_json(request: Request, payload, cache_control: str = "no-cache") -> Response:
+    """``payload`` as JSON with an ETag, or 304 when the client already has it."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    etag = etag_for(body)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _accepted(header: str) -> Set[str]:
+    codings = set()
+    for part in header.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            codings.add(name.strip())
+    return codings
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        accept = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+        codings = _accepted(accept)
+        encoding = "br" if brotli is not None and "br" in codings else "gzip" if "gzip" in codings else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                return await send(message)
+            if start is not None:
+                pending, start = start, None
+                headers = list(pending["headers"])
+                names = {name.lower(): value for name, value in headers}
+                content_type = names.get(b"content-type", b"").decode("latin-1")
+                body = message.get("body", b"")
+                compressible = content_type.startswith(COMPRESSIBLE) and b"content-encoding" not in names
+                if compressible:
+                    headers.append((b"vary", b"Accept-Encoding"))
+                if not compressible or message.get("more_body") or len(body) < self.minimum_size:
+                    # streaming or small: send as is
+                    passthrough = True
+                    await send({**pending, "headers": headers})
+                    return await send(message)
+                if len(body) > COMPRESS_THREAD_BYTES:
+                    body = await asyncio.to_thread(_compress, body, encoding)
+                else:
+                    body = _compress(body, encoding)
+                headers = [(n, v) for n, v in headers if n.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+                await send({**pending, "headers": headers})
+                return await send({"type": "http.response.body", "body": body})
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
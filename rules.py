@@ -0,0 +1,91 @@
+"""Declarative audit rules and the engine that scores a page with them.
+
+Each Rule names the page features it reads. The engine works out the
+features a plan's rules need, computes each of them once, and runs every
+rule over the results in one pass. Head rules only read <head> fields, so
+they can score a page whose body has not been parsed (see streaming.py).
+
+Benchmark the rules with: python scripts/bench_rules.py
+"""
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from analysis import PageModel
+
+DEFAULT_PLAN = "free"
+
+FEATURES: Dict[str, Callable[["PageModel"], object]] = {
+    "title": lambda page: page.title,
+    "meta_description": lambda page: page.meta_description,
+    "robots": lambda page: (page.robots or "").lower(),
+    "canonical": lambda page: page.canonical,
+    "h1_count": lambda page: len(page.headings.get("h1", [])),
+    "word_count": lambda page: page.word_count,
+    "link_count": lambda page: len(page.links),
+}
+HEAD_FEATURES = {"title", "meta_description", "robots", "canonical"}
+
+
+@dataclass(frozen=True)
+class Rule:
+    code: str
+    sev: str
+    penalty: int
+    needs: Tuple[str, ...]
+    # returns the issue message when the rule fails, None when it passes
+    check: Callable[[Dict[str, object]], Optional[str]]
+    plans: Tuple[str, ...] = ("free", "pro")
+
+    @property
+    def head(self) -> bool:
+        return all(f in HEAD_FEATURES for f in self.needs)
+
+
+def _when(condition: Callable[[Dict[str, object]], bool], msg: str):
+    return lambda f: msg if condition(f) else None
+
+
+RULES: List[Rule] = [
+    Rule("missing_title", "High", 20, ("title",), _when(lambda f: not f["title"], "Missing title")),
+    Rule("title_short", "Med", 5, ("title",), _when(lambda f: f["title"] and len(f["title"]) < 30, "Title short")),
+    Rule("title_long", "Low", 0, ("title",), _when(lambda f: len(f["title"]) > 60, "Title long"), ("pro",)),
+    Rule("no_meta_description", "High", 20, ("meta_description",),
+         _when(lambda f: f["meta_description"] is None, "No meta desc")),
+    Rule("meta_description_length", "Low", 0, ("meta_description",),
+         _when(lambda f: f["meta_description"] is not None and not 50 <= len(f["meta_description"]) <= 160,
+               "Meta desc length"), ("pro",)),
+    Rule("noindex", "High", 0, ("robots",), _when(lambda f: "noindex" in f["robots"], "Noindex"), ("pro",)),
+    Rule("no_canonical", "Low", 0, ("canonical",), _when(lambda f: not f["canonical"], "No canonical"), ("pro",)),
+    Rule("no_h1", "High", 20, ("h1_count",), _when(lambda f: f["h1_count"] == 0, "No H1")),
+    Rule("multiple_h1", "Low", 0, ("h1_count",), _when(lambda f: f["h1_count"] > 1, "Multiple H1"), ("pro",)),
+    Rule("thin_content", "High", 20, ("word_count",),
+         lambda f: f"Thin ({f['word_count']} words)" if f["word_count"] < 300 else None),
+    Rule("no_links", "Low", 0, ("link_count",), _when(lambda f: f["link_count"] == 0, "No links"), ("pro",)),
+]
+RULES_BY_CODE = {r.code: r for r in RULES}
+PLANS = sorted({p for r in RULES for p in r.plans})
+
+
+@lru_cache(maxsize=None)
+def select_rules(plan: str = DEFAULT_PLAN, head_only: bool = False) -> Tuple[Tuple[Rule, ...], Tuple[str, ...]]:
+    """The rules enabled for ``plan`` and the features they need, in rule order."""
+    if plan not in PLANS:
+        raise ValueError(f"Unknown plan: {plan}")
+    rules = tuple(r for r in RULES if plan in r.plans and (r.head or not head_only))
+    features = tuple(dict.fromkeys(f for r in rules for f in r.needs))
+    return rules, features
+
+
+def run_rules(page: "PageModel", plan: str = DEFAULT_PLAN, head_only: bool = False):
+    """Score ``page``: 100 minus the penalties of failed rules, and their issues."""
+    rules, needed = select_rules(plan, head_only)
+    features = {name: FEATURES[name](page) for name in needed}
+    score, issues = 100, []
+    for rule in rules:
+        msg = rule.check(features)
+        if msg:
+            score -= rule.penalty
+            issues.append({"code": rule.code, "sev": rule.sev, "msg": msg})
+    return max(0, score), issues
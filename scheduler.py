@@ -0,0 +1,240 @@
+"""Recurring audits stored as Schedule rows in the db.py SQLite database.
+
+Each schedule's first run lands at a random point of its first interval and
+every later run is shifted by up to SCHEDULE_JITTER of the interval, so
+thousands of weekly schedules spread over the week instead of firing
+together. A dispatch loop claims due schedules (safe with several API
+processes sharing one database), audits them through pipeline.audit_page
+under a global and a per-host concurrency cap; audit_page writes every run
+to the audit history (history.py).
+"""
+import asyncio
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Dict, List, Optional, Set
+from urllib.parse import urlsplit
+
+from pipeline import audit_page
+
+if TYPE_CHECKING:
+    from db import Schedule
+
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "30"))
+SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "8"))
+SCHEDULER_PER_HOST = int(os.getenv("SCHEDULER_PER_HOST", "2"))
+SCHEDULE_JITTER = float(os.getenv("SCHEDULE_JITTER", "0.1"))
+SCHEDULE_MIN_INTERVAL = int(os.getenv("SCHEDULE_MIN_INTERVAL", "3600"))
+DISPATCH_BATCH = 100
+USER_AGENT = "RankyPulseBot"
+
+logger = logging.getLogger(__name__)
+
+# db and SQLAlchemy are slow to import; the functions that store schedules load them on first use
+
+
+def first_run_at(interval_seconds: int, now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.utcnow()) + timedelta(seconds=random.uniform(0, interval_seconds))
+
+
+def next_run_at(due: datetime, interval_seconds: int, now: Optional[datetime] = None) -> datetime:
+    """The run after ``due``, jittered and never in the past."""
+    jitter = random.uniform(-SCHEDULE_JITTER, SCHEDULE_JITTER) * interval_seconds
+    nxt = due + timedelta(seconds=interval_seconds + jitter)
+    now = now or datetime.utcnow()
+    # a long outage should not leave a backlog of runs to catch up on
+    return nxt if nxt > now else first_run_at(interval_seconds, now)
+
+
+def schedule_status(s: "Schedule") -> dict:
+    return {
+        "id": s.id,
+        "url": s.url,
+        "plan": s.plan,
+        "interval_seconds": s.interval_seconds,
+        "enabled": s.enabled,
+        "next_run_at": s.next_run_at.isoformat(),
+        "last_run_at": s.last_run_at.isoformat() if s.last_run_at else None,
+        "last_status": s.last_status,
+        "last_score": s.last_score,
+        "last_error": s.last_error,
+    }
+
+
+def create_schedule(url: str, interval_seconds: int, plan: str = "free", user_id: Optional[int] = None) -> "Schedule":
+    if interval_seconds < SCHEDULE_MIN_INTERVAL:
+        raise ValueError(f"interval must be at least {SCHEDULE_MIN_INTERVAL} seconds")
+    from sqlmodel import Session
+    from db import Schedule, engine
+
+    s = Schedule(
+        id=uuid.uuid4().hex,
+        url=url,
+        user_id=user_id,
+        plan=plan,
+        interval_seconds=interval_seconds,
+        next_run_at=first_run_at(interval_seconds),
+    )
+    with Session(engine) as session:
+        session.add(s)
+        session.commit()
+        session.refresh(s)
+    return s
+
+
+async def get_schedule(schedule_id: str) -> Optional["Schedule"]:
+    from db import Schedule, async_session
+
+    async with async_session() as session:
+        return await session.get(Schedule, schedule_id)
+
+
+async def list_schedules(offset: int = 0, limit: int = 100) -> List["Schedule"]:
+    from sqlmodel import select
+    from db import Schedule, async_session
+
+    async with async_session() as session:
+        result = await session.exec(select(Schedule).order_by(Schedule.created_at).offset(offset).limit(limit))
+        return list(result)
+
+
+def delete_schedule(schedule_id: str) -> bool:
+    from sqlmodel import Session
+    from db import Schedule, engine
+
+    with Session(engine) as session:
+        s = session.get(Schedule, schedule_id)
+        if s is None:
+            return False
+        session.delete(s)
+        session.commit()
+        return True
+
+
+def _claim_due(now: datetime, limit: int) -> List["Schedule"]:
+    """Due schedules this process won; each is moved to its next run as it is claimed."""
+    from sqlalchemy import update
+    from sqlmodel import Session, col, select
+    from db import Schedule, engine
+
+    claimed = []
+    with Session(engine) as session:
+        due = session.exec(
+            select(Schedule)
+            .where(Schedule.enabled == True, col(Schedule.next_run_at) <= now)  # noqa: E712
+            .order_by(Schedule.next_run_at)
+            .limit(limit)
+        ).all()
+        for s in due:
+            # compare-and-set on next_run_at: another process may have claimed it first
+            won = session.execute(
+                update(Schedule)
+                .where(Schedule.id == s.id, Schedule.next_run_at == s.next_run_at)
+                .values(next_run_at=next_run_at(s.next_run_at, s.interval_seconds, now))
+            ).rowcount
+            if won:
+                claimed.append(s)
+            # detach so the rows stay readable after commit
+            session.expunge(s)
+        session.commit()
+    return claimed
+
+
+def _record(s: "Schedule", status: str, score: Optional[int], error: Optional[str]) -> None:
+    from sqlalchemy import update
+    from sqlmodel import Session
+    from db import Schedule, engine
+
+    with Session(engine) as session:
+        session.execute(
+            update(Schedule)
+            .where(Schedule.id == s.id)
+            .values(last_run_at=datetime.utcnow(), last_status=status, last_score=score, last_error=error)
+        )
+        session.commit()
+
+
+class Scheduler:
+    def __init__(
+        self,
+        concurrency: int = SCHEDULER_CONCURRENCY,
+        per_host: int = SCHEDULER_PER_HOST,
+        poll: float = SCHEDULER_POLL_SECONDS,
+    ):
+        self.poll = poll
+        self.per_host = per_host
+        self.slots = asyncio.Semaphore(concurrency)
+        # per-host semaphores exist only while a run for the host is active
+        self.host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_users: Dict[str, int] = {}
+        self.running: Set[str] = set()
+        self.stats = {"dispatched": 0, "done": 0, "skipped": 0, "failed": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._runs: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._task = asyncio.ensure_future(self._loop())
+
+    async def stop(self) -> None:
+        tasks = [t for t in [self._task, *self._runs] if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task, self._runs = None, set()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.dispatch()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. a locked database; the due schedules are still due next poll
+                logger.exception("schedule dispatch failed")
+            await asyncio.sleep(self.poll)
+
+    async def dispatch(self) -> int:
+        """Start every due schedule; returns how many were started."""
+        due = await asyncio.to_thread(_claim_due, datetime.utcnow(), DISPATCH_BATCH)
+        started = 0
+        for s in due:
+            if s.id in self.running:
+                continue
+            self.running.add(s.id)
+            task = asyncio.ensure_future(self._run(s))
+            self._runs.add(task)
+            task.add_done_callback(self._runs.discard)
+            started += 1
+        self.stats["dispatched"] += started
+        return started
+
+    async def _run(self, s: "Schedule") -> None:
+        host = (urlsplit(s.url).hostname or "").lower()
+        host_slot = self.host_slots.setdefault(host, asyncio.Semaphore(self.per_host))
+        self._host_users[host] = self._host_users.get(host, 0) + 1
+        try:
+            # host slot first so one slow site cannot hold global slots idle
+            async with host_slot, self.slots:
+                try:
+                    audit, skipped = await audit_page(s.url, headers={"User-Agent": USER_AGENT}, plan=s.plan)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    status, score, error = "failed", None, str(e) or e.__class__.__name__
+                else:
+                    status, score, error = ("skipped" if skipped else "done"), audit["overview"]["score"], None
+            self.stats[status] += 1
+            try:
+                await asyncio.to_thread(_record, s, status, score, error)
+            except Exception:
+                logger.exception("could not record run of schedule %s", s.id)
+        finally:
+            self.running.discard(s.id)
+            self._host_users[host] -= 1
+            if not self._host_users[host]:
+                del self._host_users[host], self.host_slots[host]
+
+
+scheduler = Scheduler()
@@ -0,0 +1,84 @@
+"""Benchmark concurrent SQLite writes through db.py.
+
+Usage: python scripts/bench_db.py [--workers 4] [--writes 500] [--batch 1] [--baseline]
+
+Starts --workers processes (like uvicorn workers) that each commit --writes
+transactions of --batch analytics events to a scratch database, then reports
+total rows/s and how many transactions failed with "database is locked".
+--baseline runs the same load with SQLite's defaults (rollback journal,
+synchronous=FULL, no busy timeout) for comparison.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+BASELINE = {"DB_JOURNAL_MODE": "DELETE", "DB_SYNCHRONOUS": "FULL", "DB_BUSY_TIMEOUT_MS": "0"}
+
+
+def worker(n, writes, batch, start_at, results):
+    from sqlalchemy.exc import OperationalError
+
+    from db import AnalyticsEvent, bulk_insert
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    ok = locked = 0
+    for i in range(writes):
+        rows = [{"ts": int(time.time()), "et": "bench", "data": f'{{"w": {n}, "i": {i}}}'} for _ in range(batch)]
+        try:
+            bulk_insert(AnalyticsEvent, rows)
+            ok += 1
+        except OperationalError as e:
+            if "locked" not in str(e):
+                raise
+            locked += 1
+    results.put((ok, locked))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=500)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--baseline", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_FILE"] = str(Path(tmp) / "bench.db")
+        if args.baseline:
+            os.environ.update(BASELINE)
+        from db import create_db_and_tables
+
+        create_db_and_tables()
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        start_at = time.time() + 2  # let every worker finish importing first
+        procs = [
+            ctx.Process(target=worker, args=(n, args.writes, args.batch, start_at, results))
+            for n in range(args.workers)
+        ]
+        for p in procs:
+            p.start()
+        counts = [results.get() for _ in procs]
+        elapsed = time.time() - start_at
+        for p in procs:
+            p.join()
+
+    ok = sum(c[0] for c in counts)
+    locked = sum(c[1] for c in counts)
+    mode = "baseline" if args.baseline else "tuned"
+    print(
+        f"{mode}: {args.workers} workers x {args.writes} txns x {args.batch} rows in {elapsed:.2f}s: "
+        f"{ok / elapsed:.0f} txn/s, {ok * args.batch / elapsed:.0f} rows/s, {locked} locked errors"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Micro-benchmark the audit rules in rules.py.
+
+Usage: python scripts/bench_rules.py [--plan pro] [--repeat N] [page.html ...]
+
+Parses the conformance samples (plus any HTML files given) once, then times
+every feature extractor and every rule check over them and prints the cost
+per page in microseconds, slowest first, with the full run_rules cost per plan.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from check_parser_conformance import SAMPLES  # noqa: E402
+from parsers import parse_page  # noqa: E402
+from rules import FEATURES, PLANS, RULES, run_rules, select_rules  # noqa: E402
+
+
+def per_page_us(fn, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            fn(page)
+    return (time.perf_counter() - start) / (repeat * len(pages)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plan", choices=PLANS)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("paths", nargs="*")
+    args = parser.parse_args()
+
+    html = list(SAMPLES.values()) + [Path(p).read_text(encoding="utf-8", errors="replace") for p in args.paths]
+    pages = [parse_page(h) for h in html]
+    rules = [r for r in RULES if args.plan is None or args.plan in r.plans]
+
+    features = {name: per_page_us(fn, pages, args.repeat) for name, fn in FEATURES.items()}
+    # evaluate checks on precomputed features so each rule's own cost is isolated
+    precomputed = [{name: fn(page) for name, fn in FEATURES.items()} for page in pages]
+    checks = {r.code: per_page_us(r.check, precomputed, args.repeat) for r in rules}
+
+    print(f"{len(pages)} pages, {args.repeat} repeats, microseconds per page\n")
+    print(f"{'feature':<24}{'us':>8}")
+    for name, us in sorted(features.items(), key=lambda kv: -kv[1]):
+        print(f"{name:<24}{us:8.3f}")
+    print(f"\n{'rule':<24}{'check us':>10}{'features us':>13}  plans")
+    for r in sorted(rules, key=lambda r: -checks[r.code]):
+        print(f"{r.code:<24}{checks[r.code]:10.3f}{sum(features[f] for f in r.needs):13.3f}  {','.join(r.plans)}")
+    print()
+    for plan in [args.plan] if args.plan else PLANS:
+        for head_only in (False, True):
+            n = len(select_rules(plan, head_only)[0])
+            us = per_page_us(lambda p: run_rules(p, plan, head_only), pages, args.repeat)
+            print(f"run_rules plan={plan:<5} head_only={head_only!s:<5} {n:2d} rules {us:8.3f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark cold start: importing main.py and serving the first /health.
+
+Usage: python scripts/bench_startup.py [--runs 10] [--ref HEAD~1] [--warm-up]
+
+Each run is a fresh interpreter. Reports the median time to import main,
+which heavy dependencies that import pulled in, and the median time from
+launching uvicorn to the first successful /health response. --ref also
+measures a git revision (exported to a temp dir) for comparison, and
+--warm-up runs with WARM_UP=1.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("reportlab", "numpy", "aiohttp", "lxml", "selectolax", "bs4", "uvicorn")
+IMPORT_PROBE = (
+    "import sys, time; t = time.perf_counter(); import main; "
+    "print(time.perf_counter() - t); print(','.join(m for m in {heavy!r} if m in sys.modules))"
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def import_time(tree: Path, env: dict):
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE.format(heavy=HEAVY)],
+        cwd=tree, env=env, capture_output=True, text=True, check=True,
+    ).stdout.split("\n")
+    return float(out[0]), out[1]
+
+
+def first_health(tree: Path, env: dict, timeout: float = 60) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=tree, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+                return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.005)
+        raise RuntimeError("server did not answer /health")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def measure(label: str, tree: Path, runs: int, warm_up: bool) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {
+            **os.environ,
+            "DATABASE_FILE": str(Path(tmp) / "startup.db"),
+            "DF_INDEX_DIR": str(Path(tmp) / "dfindex"),
+            "ANALYTICS_FILE": str(Path(tmp) / "analytics.jsonl"),
+            "WARM_UP": "1" if warm_up else "0",
+        }
+        imports = [import_time(tree, env) for _ in range(runs)]
+        health = [first_health(tree, env) for _ in range(runs)]
+    seconds = [t for t, _ in imports]
+    print(f"{label}:")
+    print(f"  import main      median {statistics.median(seconds) * 1000:7.0f} ms  min {min(seconds) * 1000:7.0f} ms")
+    print(f"  first /health    median {statistics.median(health) * 1000:7.0f} ms  min {min(health) * 1000:7.0f} ms")
+    print(f"  heavy modules    {imports[-1][1] or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--ref", help="also measure this git revision")
+    parser.add_argument("--warm-up", action="store_true", help="run with WARM_UP=1")
+    args = parser.parse_args()
+
+    if args.ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            archive = subprocess.run(["git", "archive", args.ref], cwd=ROOT, capture_output=True, check=True).stdout
+            subprocess.run(["tar", "-x", "-C", tmp], input=archive, check=True)
+            measure(args.ref, Path(tmp), args.runs, args.warm_up)
+    measure("working tree", ROOT, args.runs, args.warm_up)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Check that every installed HTML parser backend scores pages identically.
+
+Usage: python scripts/check_parser_conformance.py [page.html ...]
+
+Runs calculate_score and extract_keywords over the built-in samples (plus any
+HTML files given) with each backend from parsers.py, and with the streaming
+analyzer fed in small chunks, and exits non-zero if any disagrees with
+html.parser.
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from analysis import calculate_score, extract_keywords  # noqa: E402
+from parsers import available_backends, parse_page  # noqa: E402
+from streaming import FEED_PARSERS, StreamingAnalyzer, close_feed, make_feed_parser  # noqa: E402
+
+STREAM_CHUNK = 7  # small enough to split tags, entities and words
+
+SAMPLES = {
+    "empty": "",
+    "fragment": "<p>Just a fragment of text</p>",
+    "no_head": "<body><h1>Heading only</h1><p>Some words here</p></body>",
+    "full": (
+        "<!doctype html><html><head><title>Complete guide to technical SEO audits</title>"
+        "<meta name='description' content='Everything about audits'>"
+        "<meta name='robots' content='index,follow'>"
+        "<link rel='canonical' href='https://example.com/guide'></head>"
+        "<body><h1>Technical <em>SEO</em> audits</h1>"
+        + "<p>Crawling indexing rendering structured content performance.</p>" * 80
+        + "<h2>Checklist</h2><ul><li>titles</li><li>descriptions</li></ul></body></html>"
+    ),
+    "skipped_text": (
+        "<html><head><title>Short</title><style>body{color:red}</style></head><body>"
+        "<script>var hidden = 'invisible words';</script><noscript>enable javascript</noscript>"
+        "<h1>Visible <script>nope()</script>heading</h1><!-- a comment -->after comment"
+        "<template><p>template text</p></template><p>entities &amp; more&nbsp;text</p></body></html>"
+    ),
+    "xml_declaration": (
+        '<?xml version="1.0" encoding="utf-8"?><html><head><title>XHTML page</title></head>'
+        "<body><h1>Hello</h1></body></html>"
+    ),
+    "uppercase": "<HTML><HEAD><TITLE>Upper</TITLE><META NAME='Description' CONTENT='x'></HEAD><BODY><H1>Up</H1></BODY></HTML>",
+}
+
+
+def parse_streamed(html, name):
+    target = StreamingAnalyzer()
+    parser = make_feed_parser(target, name)
+    for i in range(0, len(html), STREAM_CHUNK):
+        parser.feed(html[i:i + STREAM_CHUNK])
+    return close_feed(parser, target)
+
+
+def results(html, backend):
+    if backend.startswith("stream:"):
+        page = parse_streamed(html, backend[len("stream:"):])
+    else:
+        page = parse_page(html, backend)
+    return {"score": calculate_score(page), "keywords": extract_keywords(page)}
+
+
+def main(paths):
+    samples = dict(SAMPLES)
+    for p in paths:
+        samples[p] = Path(p).read_text(encoding="utf-8", errors="replace")
+    backends = available_backends() + [f"stream:{name}" for name in FEED_PARSERS]
+    print(f"backends: {', '.join(backends)}")
+    failures = 0
+    for name, html in samples.items():
+        expected = results(html, "html.parser")
+        for backend in backends:
+            start = time.perf_counter()
+            got = results(html, backend)
+            ms = (time.perf_counter() - start) * 1000
+            ok = got == expected
+            failures += not ok
+            print(f"{'ok  ' if ok else 'FAIL'} {name:<20} {backend:<12} {ms:8.2f} ms")
+            if not ok:
+                print(f"     expected {expected}\n     got      {got}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
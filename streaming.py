@@ -0,0 +1,256 @@
+"""Incremental page analysis for bodies too large to buffer.
+
+The body is decoded and fed chunk by chunk to an event parser (lxml's feed
+parser when installed, the stdlib HTMLParser otherwise) that fills in a
+PageModel as tags arrive. Text is reduced to keyword term counts (a bounded
+TermCounter) and a word count as it goes; neither the text nor its tokens
+are kept, and reading stops at a byte budget. Once the <head> has been seen
+the head checks can run, so ``head_only`` streams stop there without
+downloading the rest of the page.
+"""
+import asyncio
+import codecs
+import os
+import time
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import AsyncIterator, List, Optional
+
+import metrics
+from analysis import HEADING_TAGS, SKIP_TAGS, PageModel, tokenize
+from keywords import TermCounter
+
+# bodies above STREAM_THRESHOLD_BYTES are analysed incrementally, up to STREAM_MAX_BYTES
+STREAM_ANALYSIS = os.getenv("STREAM_ANALYSIS", "1") == "1"
+STREAM_THRESHOLD_BYTES = int(os.getenv("STREAM_THRESHOLD_BYTES", str(1024 * 1024)))
+STREAM_MAX_BYTES = int(os.getenv("STREAM_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+class StreamingAnalyzer:
+    """Parser target that builds a PageModel from start/end/data events."""
+
+    def __init__(self):
+        self.page = PageModel()
+        self.terms = TermCounter()
+        self.head_complete = False
+        self._text: List[str] = []
+        self._skip = 0
+        self._title: Optional[List[str]] = None
+        self._seen_title = False
+        self._heading: Optional[str] = None
+        self._heading_text: List[str] = []
+
+    def _flush(self) -> None:
+        """Finish the text run collected since the last tag."""
+        if not self._text:
+            return
+        text, self._text = "".join(self._text), []
+        if self._title is not None:
+            self._title.append(text)
+        if self._skip:
+            return
+        piece = text.strip()
+        if piece:
+            self.terms.add(tokenize(piece))
+            self.page.word_count += len(piece.split())
+            if self._heading is not None:
+                self._heading_text.append(piece)
+
+    def start(self, tag: str, attrs: dict) -> None:
+        self._flush()
+        if tag == "title" and not self._seen_title:
+            self._title, self._seen_title = [], True
+        elif tag == "meta":
+            meta_name = (attrs.get("name") or "").lower()
+            if meta_name == "description" and self.page.meta_description is None:
+                self.page.meta_description = attrs.get("content") or ""
+            elif meta_name == "robots" and self.page.robots is None:
+                self.page.robots = attrs.get("content") or ""
+        elif tag == "link":
+            if self.page.canonical is None and "canonical" in (attrs.get("rel") or "").lower().split():
+                self.page.canonical = attrs.get("href") or ""
+        elif tag in HEADING_TAGS and self._heading is None:
+            self._heading, self._heading_text = tag, []
+        elif tag == "a" and attrs.get("href"):
+            self.page.links.append(attrs["href"])
+        elif tag == "body":
+            self.head_complete = True
+        if tag in SKIP_TAGS:
+            self._skip += 1
+
+    def end(self, tag: str) -> None:
+        self._flush()
+        if tag in SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        if tag == "title" and self._title is not None:
+            self.page.title, self._title = "".join(self._title).strip(), None
+        elif tag == self._heading:
+            self.page.headings.setdefault(tag, []).append(" ".join(self._heading_text))
+            self._heading = None
+        elif tag == "head":
+            self.head_complete = True
+
+    def data(self, text: str) -> None:
+        self._text.append(text)
+
+    def comment(self, text: str) -> None:
+        self._flush()
+
+    def close(self) -> PageModel:
+        self._flush()
+        if self._title is not None:
+            self.page.title, self._title = "".join(self._title).strip(), None
+        self.head_complete = True
+        if self.page.term_counts is None:
+            self.page.term_counts = self.terms.counts()
+        return self.page
+
+
+class _StdlibFeed(HTMLParser):
+    """Drive a StreamingAnalyzer from the stdlib HTMLParser."""
+
+    def __init__(self, target: StreamingAnalyzer):
+        super().__init__(convert_charrefs=True)
+        self.target = target
+
+    def handle_starttag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.target.start(tag, dict(attrs))
+        if tag in SKIP_TAGS or tag in HEADING_TAGS:
+            self.target.end(tag)
+
+    def handle_endtag(self, tag):
+        self.target.end(tag)
+
+    def handle_data(self, data):
+        self.target.data(data)
+
+    def handle_comment(self, data):
+        self.target.comment(data)
+
+    def close(self) -> PageModel:
+        super().close()
+        return self.target.close()
+
+
+class _LxmlFeed:
+    """Drive a StreamingAnalyzer from lxml's feed parser.
+
+    lxml drops the text that follows a raw-text element when its end tag is
+    split across two ``feed`` calls, so a trailing partial ``</script`` or
+    ``</style`` is held back and prepended to the next chunk.
+    """
+
+    _RAW_END_TAGS = ("</script", "</style")
+
+    def __init__(self, target: StreamingAnalyzer):
+        import lxml.etree
+
+        self._parser = lxml.etree.HTMLParser(target=target)
+        self._pending = ""
+
+    def _split(self, text: str):
+        cut = text.rfind("<")
+        if cut == -1:
+            return text, ""
+        tail = text[cut:].lower()
+        if ">" in tail:
+            return text, ""
+        for end_tag in self._RAW_END_TAGS:
+            if end_tag.startswith(tail) or tail.startswith(end_tag):
+                return text[:cut], text[cut:]
+        return text, ""
+
+    def feed(self, text: str) -> None:
+        ready, self._pending = self._split(self._pending + text)
+        if ready:
+            self._parser.feed(ready)
+
+    def close(self):
+        if self._pending:
+            self._parser.feed(self._pending)
+            self._pending = ""
+        return self._parser.close()
+
+
+FEED_PARSERS = ("lxml", "html.parser")
+
+
+def make_feed_parser(target: StreamingAnalyzer, name: Optional[str] = None):
+    """An object with ``feed(str)`` and ``close()`` that drives ``target``.
+
+    Uses lxml when installed unless ``name`` picks one of FEED_PARSERS.
+    """
+    if name != "html.parser":
+        try:
+            return _LxmlFeed(target)
+        except ImportError:
+            if name == "lxml":
+                raise
+    return _StdlibFeed(target)
+
+
+@dataclass
+class StreamResult:
+    page: PageModel
+    size: int
+    truncated: bool
+
+
+async def analyze_stream(
+    chunks: AsyncIterator[bytes],
+    encoding: str = "utf-8",
+    max_bytes: int = STREAM_MAX_BYTES,
+    head_only: bool = False,
+    hasher=None,
+) -> StreamResult:
+    """Feed ``chunks`` to an incremental parser until they end or the budget runs out.
+
+    Each chunk is parsed in a worker thread so a huge page never holds the
+    event loop for longer than one chunk takes to read. ``hasher`` is updated
+    with exactly the bytes that were analysed.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    target = StreamingAnalyzer()
+    parser = make_feed_parser(target)
+    size, truncated = 0, False
+    decode_time = parse_time = 0.0
+    async for chunk in chunks:
+        if size + len(chunk) > max_bytes:
+            chunk, truncated = chunk[: max_bytes - size], True
+        size += len(chunk)
+        if hasher is not None:
+            hasher.update(chunk)
+        start = time.perf_counter()
+        text = decoder.decode(chunk)
+        decode_time += time.perf_counter() - start
+        if text:
+            start = time.perf_counter()
+            await asyncio.to_thread(parser.feed, text)
+            parse_time += time.perf_counter() - start
+        if truncated or (head_only and target.head_complete):
+            truncated = True
+            break
+    else:
+        tail = decoder.decode(b"", final=True)
+        if tail:
+            parser.feed(tail)
+    page = await asyncio.to_thread(close_feed, parser, target)
+    # one observation per page, like the buffered parse stage
+    metrics.observe("stage_seconds", decode_time, stage="decode")
+    metrics.observe("stage_seconds", parse_time, stage="parse")
+    return StreamResult(page=page, size=size, truncated=truncated)
+
+
+def close_feed(parser, target: StreamingAnalyzer) -> PageModel:
+    try:
+        parser.close()
+    except Exception:
+        # lxml raises on an empty or broken document; keep what was collected
+        pass
+    return target.close()
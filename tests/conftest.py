@@ -0,0 +1,18 @@
+"""Point every on-disk store at a scratch directory before the app modules load."""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_scratch = Path(tempfile.mkdtemp(prefix="rankypulse-tests-"))
+os.environ.setdefault("DATABASE_FILE", str(_scratch / "test.db"))
+os.environ.setdefault("DF_INDEX_DIR", "")  # in-memory document frequencies
+os.environ.setdefault("CRAWL_STATE_DIR", str(_scratch / "crawls"))
+os.environ.setdefault("ANALYTICS_FILE", str(_scratch / "analytics.jsonl"))
+os.environ.setdefault("CACHE_REDIS_URL", "")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db import create_db_and_tables  # noqa: E402
+
+create_db_and_tables()
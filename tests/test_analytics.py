@@ -0,0 +1,34 @@
+import asyncio
+
+import analytics
+from analytics import AnalyticsSink
+
+
+def test_writer_retries_a_failed_flush_and_keeps_running(monkeypatch, tmp_path):
+    written, calls = [], []
+
+    def record_events(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        written.extend(batch)
+        return len(batch)
+
+    monkeypatch.setattr(analytics, "record_events", record_events)
+    log = tmp_path / "analytics.jsonl"
+
+    async def run():
+        sink = AnalyticsSink(log, interval=0.01, retry_delay=0.01)
+        await sink.start()
+        for i in range(3):
+            await sink.emit("analyzed", {"i": i})
+        await asyncio.sleep(0.1)
+        alive = not sink._task.done()
+        await sink.emit("analyzed", {"i": 3})
+        await sink.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert [d["i"] for _, _, d in written] == [0, 1, 2, 3]
+    # the raw log is appended once per batch, not once per attempt
+    assert len(log.read_text().splitlines()) == 4
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+import cache
+from analysis import PageModel
+from cache import CacheEntry, MemoryCache, normalize_url, page_size
+
+
+def entry(tokens=(), ttl=60.0, **fields):
+    return CacheEntry(url="u", page=PageModel(tokens=list(tokens)), content_hash="h", expires_at=time.time() + ttl, **fields)
+
+
+def test_normalize_url():
+    assert normalize_url("HTTPS://Example.com:443/?b=2&a=1#top") == "https://example.com/?a=1&b=2"
+    assert normalize_url("http://example.com:8080") == "http://example.com:8080/"
+
+
+def test_expired_entry_is_kept_stale_then_dropped(monkeypatch):
+    c = MemoryCache()
+    asyncio.run(c.set("k", entry(ttl=-1)))
+    got = asyncio.run(c.get("k"))
+    assert got is not None and not got.fresh
+    monkeypatch.setattr(cache, "CACHE_STALE_SECONDS", 0)
+    assert asyncio.run(c.get("k")) is None
+    assert len(c) == 0 and c.bytes == 0
+
+
+def test_lru_by_entry_count():
+    c = MemoryCache(max_entries=2)
+
+    async def run():
+        await c.set("a", entry())
+        await c.set("b", entry())
+        await c.get("a")
+        await c.set("c", entry())
+        return [k for k in "abc" if await c.get(k) is not None]
+
+    assert asyncio.run(run()) == ["a", "c"]
+
+
+def test_lru_by_byte_budget():
+    size = page_size(PageModel(tokens=["word"] * 100))
+    c = MemoryCache(max_bytes=size * 2)
+
+    async def run():
+        for key in "abc":
+            await c.set(key, entry(["word"] * 100))
+        await c.set("huge", entry(["word"] * 1000))
+        return [k for k in ("a", "b", "c", "huge") if await c.get(k) is not None]
+
+    assert asyncio.run(run()) == ["b", "c"]
+    assert c.bytes == size * 2
+
+
+def test_resetting_an_entry_keeps_its_size():
+    c = MemoryCache()
+
+    async def run():
+        await c.set("a", entry(["word"] * 10))
+        e = await c.get("a")
+        e.expires_at += 60
+        await c.set("a", e)
+
+    asyncio.run(run())
+    assert c.bytes == page_size(PageModel(tokens=["word"] * 10))
+
+
+def test_json_round_trip():
+    e = CacheEntry(
+        url="https://example.com/",
+        page=PageModel(title="T", headings={"h1": ["Hi"]}, tokens=["hi"], word_count=1, links=["/a"]),
+        content_hash="abc",
+        etag='"v1"',
+        expires_at=123.0,
+    )
+    assert CacheEntry.from_json(e.to_json().encode()) == e
@@ -0,0 +1,63 @@
+import asyncio
+import random
+import threading
+
+from df_index import DiskDocumentFrequency, MemoryDocumentFrequency
+
+
+def test_disk_matches_memory_across_concurrent_compactions(tmp_path):
+    disk, memory = DiskDocumentFrequency(str(tmp_path), compact_bytes=1 << 30), MemoryDocumentFrequency()
+    rng = random.Random(1)
+    docs = [{f"t{rng.randrange(500)}" for _ in range(20)} for _ in range(400)]
+    for doc in docs[:200]:
+        disk.add_document(doc)
+        memory.add_document(doc)
+
+    def add_rest():
+        for doc in docs[200:]:
+            disk.add_document(doc)
+            memory.add_document(doc)
+
+    adder = threading.Thread(target=add_rest)
+    adder.start()
+    for _ in range(5):
+        disk.compact()
+    adder.join()
+    terms = [f"t{i}" for i in range(500)] + ["missing"]
+    assert disk.df_many(terms) == memory.df_many(terms)
+    disk.compact()
+    assert disk.df_many(terms) == memory.df_many(terms)
+    assert disk.n_docs == memory.n_docs == 400
+
+
+def test_set_document_counts_once_and_replaces(tmp_path):
+    for df in (DiskDocumentFrequency(str(tmp_path)), MemoryDocumentFrequency()):
+        assert df.set_document("u1", "v1", ["a", "b"])
+        assert not df.set_document("u1", "v1", ["a", "b"])
+        df.set_document("u2", "v1", ["a"])
+        assert (df.n_docs, df.df_many(["a", "b", "c"])) == (2, [2, 1, 0])
+        df.set_document("u1", "v2", ["a", "c"])
+        assert (df.n_docs, df.df_many(["a", "b", "c"])) == (2, [2, 0, 1])
+        df.compact()
+        assert (df.n_docs, df.df_many(["a", "b", "c"])) == (2, [2, 0, 1])
+
+
+def test_store_page_counts_terms_off_the_event_loop(monkeypatch):
+    import pipeline
+    from analysis import PageModel
+    from fetcher import FetchResult
+
+    loop_thread, seen = threading.get_ident(), []
+    df = MemoryDocumentFrequency()
+
+    def set_document(doc_id, version, terms):
+        seen.append(threading.get_ident())
+        return MemoryDocumentFrequency.set_document(df, doc_id, version, terms)
+
+    monkeypatch.setattr(pipeline, "document_frequency", df)
+    monkeypatch.setattr(df, "set_document", set_document)
+    monkeypatch.setattr(pipeline, "page_terms", lambda page: seen.append(threading.get_ident()) or {"seo": 1})
+    r = FetchResult(url="https://example.com/", status=200, body=b"", reason="OK", encoding="utf-8", headers={})
+    asyncio.run(pipeline._store_page("https://example.com/", r, PageModel(), "h1", parsed=True))
+    assert len(seen) == 2 and loop_thread not in seen
+    assert df.df("seo") == 1
@@ -0,0 +1,22 @@
+import asyncio
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from executor import StageExecutor
+
+
+def test_pool_is_replaced_after_a_worker_dies():
+    ex = StageExecutor("process", workers=1)
+
+    async def run():
+        try:
+            with pytest.raises(BrokenProcessPool):
+                # kills the worker on the first try and again on the retry
+                await ex.run("parse", os._exit, 1)
+            return await ex.run("parse", abs, -3)
+        finally:
+            ex.shutdown()
+
+    assert asyncio.run(run()) == 3
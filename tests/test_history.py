@@ -0,0 +1,19 @@
+import history
+
+
+def audit(score):
+    return {"overview": {"score": score}, "issues": [], "keywords": []}
+
+
+def test_site_pages_list_each_url_once_with_its_latest_audit():
+    history.record_audit("https://pages.example/a", audit(50), ts=1000)
+    history.record_audit("https://pages.example/a", audit(60), ts=2000)
+    history.record_audit("https://pages.example/a", audit(70), ts=2000)
+    history.record_audit("https://pages.example/b", audit(80), ts=3000)
+    history.record_audit("https://pages.example/b", audit(40), ts=1500)  # backfilled, older
+
+    pages = list(history.iter_site_pages("pages.example"))
+    assert [(p["url"], p["score"]) for p in pages] == [
+        ("https://pages.example/a", 70),
+        ("https://pages.example/b", 80),
+    ]
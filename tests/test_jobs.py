@@ -0,0 +1,121 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from db import Job, dispose_async_engine
+from jobs import JobQueue, QueueFull
+
+
+def run_queue(body, workers=1, maxsize=10):
+    async def run():
+        q = JobQueue(workers=workers, maxsize=maxsize)
+        await q.start()
+        try:
+            return await body(q)
+        finally:
+            await q.stop()
+            await dispose_async_engine()
+
+    return asyncio.run(run())
+
+
+def test_job_runs_and_stores_its_result(monkeypatch):
+    async def task(url):
+        return url.encode()
+
+    monkeypatch.setitem(jobs.TASKS, "audit", (task, "text/plain"))
+
+    async def body(q):
+        job = await q.submit("audit", "https://example.com/")
+        await q.queue.join()
+        return await q.get(job.id)
+
+    job = run_queue(body)
+    assert (job.status, job.result, job.media_type) == ("done", b"https://example.com/", "text/plain")
+    assert job.expires_at is not None
+
+
+def test_failed_task_is_recorded(monkeypatch):
+    async def task(url):
+        raise ValueError("boom")
+
+    monkeypatch.setitem(jobs.TASKS, "audit", (task, "text/plain"))
+
+    async def body(q):
+        job = await q.submit("audit", "https://example.com/")
+        await q.queue.join()
+        return await q.get(job.id)
+
+    job = run_queue(body)
+    assert (job.status, job.error) == ("failed", "boom")
+
+
+def test_runner_survives_a_database_error(monkeypatch):
+    async def task(url):
+        return b"ok"
+
+    monkeypatch.setitem(jobs.TASKS, "audit", (task, "text/plain"))
+    update, calls = jobs._update, []
+
+    def flaky_update(job_id, **fields):
+        calls.append(fields)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return update(job_id, **fields)
+
+    monkeypatch.setattr(jobs, "_update", flaky_update)
+
+    async def body(q):
+        first = await q.submit("audit", "https://example.com/1")
+        second = await q.submit("audit", "https://example.com/2")
+        await q.queue.join()
+        return await q.get(first.id), await q.get(second.id)
+
+    first, second = run_queue(body)
+    assert first.status == "failed"
+    assert second.status == "done"
+
+
+def test_submit_rejects_when_full_and_unknown_kinds(monkeypatch):
+    async def task(url):
+        return b""
+
+    monkeypatch.setitem(jobs.TASKS, "audit", (task, "text/plain"))
+
+    async def body(q):
+        for runner in q._tasks:
+            runner.cancel()
+        await q.submit("audit", "https://example.com/")
+        with pytest.raises(QueueFull):
+            await q.submit("audit", "https://example.com/")
+        with pytest.raises(ValueError):
+            await q.submit("nope", "https://example.com/")
+
+    run_queue(body, maxsize=1)
+
+
+def test_start_fails_only_jobs_whose_lease_ran_out():
+    now = datetime.utcnow()
+
+    def job(lease_until):
+        return jobs._insert(Job(id=uuid.uuid4().hex, kind="audit", status="running", owner="other", lease_until=lease_until))
+
+    live, dead, legacy = job(now + timedelta(seconds=60)), job(now - timedelta(seconds=1)), job(None)
+
+    async def body(q):
+        return [await q.get(j.id) for j in (live, dead, legacy)]
+
+    live, dead, legacy = run_queue(body)
+    assert live.status == "running"
+    assert (dead.status, dead.error) == ("failed", "Interrupted by restart")
+    assert legacy.status == "failed"
+
+
+def test_leases_of_own_jobs_are_renewed():
+    owner, now = uuid.uuid4().hex, datetime.utcnow()
+    job = jobs._insert(Job(id=uuid.uuid4().hex, kind="audit", owner=owner, lease_until=now))
+    assert jobs._renew_leases(owner, now + timedelta(seconds=5)) == 0
+    assert jobs._update(job.id).lease_until == now + timedelta(seconds=5 + jobs.JOB_LEASE)
@@ -0,0 +1,25 @@
+import pytest
+
+import keywords
+from df_index import MemoryDocumentFrequency
+from keywords import drop_covered, top_keywords
+
+
+def test_covered_ngrams_are_dropped():
+    ranked = ["seo", "audit", "seo audit", "audit tool", "seo audit tool", "speed", "seo"]
+    assert drop_covered(ranked, 10) == ["seo audit tool", "speed"]
+
+
+def test_single_word_topic():
+    assert top_keywords(["seo"], df=MemoryDocumentFrequency()) == ["seo"]
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_tied_scores_rank_the_same_with_and_without_numpy(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+    monkeypatch.setattr(keywords, "_np", None if use_numpy else False)
+    # every unigram and bigram occurs once, so all scores tie
+    tokens = ["zeta", "yak", "xray", "walrus", "vole", "umbra", "tapir", "sloth"]
+    ranked = top_keywords(tokens, k=3, df=MemoryDocumentFrequency())
+    assert ranked == ["sloth", "tapir", "umbra"]
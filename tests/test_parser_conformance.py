@@ -0,0 +1,15 @@
+"""The samples from scripts/check_parser_conformance.py, as tests."""
+import pytest
+
+from parsers import available_backends
+from scripts.check_parser_conformance import SAMPLES, results
+from streaming import FEED_PARSERS
+
+BACKENDS = available_backends() + [f"stream:{name}" for name in FEED_PARSERS]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("sample", sorted(SAMPLES))
+def test_backend_matches_html_parser(sample, backend):
+    html = SAMPLES[sample]
+    assert results(html, backend) == results(html, "html.parser")
@@ -0,0 +1,91 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, update
+from sqlmodel import Session
+
+import scheduler
+from db import Schedule, dispose_async_engine, engine
+from scheduler import Scheduler, _claim_due, create_schedule, get_schedule
+
+
+def load(schedule_id):
+    async def run():
+        try:
+            return await get_schedule(schedule_id)
+        finally:
+            await dispose_async_engine()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def due_schedules():
+    with Session(engine) as session:
+        session.execute(delete(Schedule))
+        session.commit()
+    created = [create_schedule(f"https://site{i % 3}.example/page{i}", 3600) for i in range(12)]
+    with Session(engine) as session:
+        session.execute(update(Schedule).values(next_run_at=datetime.utcnow() - timedelta(minutes=1)))
+        session.commit()
+    return created
+
+
+def test_each_due_schedule_is_claimed_once(due_schedules):
+    now = datetime.utcnow()
+    with ThreadPoolExecutor(4) as pool:
+        claims = list(pool.map(lambda _: _claim_due(now, 100), range(4)))
+    ids = [s.id for claimed in claims for s in claimed]
+    assert sorted(ids) == sorted(s.id for s in due_schedules)
+    assert _claim_due(datetime.utcnow(), 100) == []
+
+
+def test_claim_moves_next_run_forward(due_schedules):
+    now = datetime.utcnow()
+    _claim_due(now, 100)
+    s = load(due_schedules[0].id)
+    assert s.next_run_at > now
+
+
+def test_runs_record_status_and_release_host_slots(due_schedules, monkeypatch):
+    async def audit_page(url, headers=None, plan="free"):
+        return {"overview": {"score": 80}}, False
+
+    monkeypatch.setattr(scheduler, "audit_page", audit_page)
+
+    async def run():
+        s = Scheduler(concurrency=4, per_host=1)
+        started = await s.dispatch()
+        await asyncio.gather(*s._runs)
+        return s, started
+
+    s, started = asyncio.run(run())
+    assert started == len(due_schedules)
+    assert s.stats["done"] == len(due_schedules)
+    assert s.host_slots == {} and s.running == set()
+    stored = load(due_schedules[0].id)
+    assert (stored.last_status, stored.last_score) == ("done", 80)
+
+
+def test_loop_keeps_running_after_a_dispatch_error(monkeypatch):
+    calls = []
+
+    async def dispatch():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return 0
+
+    async def run():
+        s = Scheduler(poll=0.01)
+        monkeypatch.setattr(s, "dispatch", dispatch)
+        await s.start()
+        await asyncio.sleep(0.1)
+        alive = not s._task.done()
+        await s.stop()
+        return alive
+
+    assert asyncio.run(run())
+    assert len(calls) > 1
@@ -0,0 +1,77 @@
+import asyncio
+import random
+
+import pytest
+
+import keywords
+from analysis import page_terms
+from keywords import TermCounter, _counts_python, term_counts
+from parsers import parse_page
+from streaming import FEED_PARSERS, StreamingAnalyzer, analyze_stream, close_feed, make_feed_parser
+
+
+def _stream(html, name, chunk):
+    target = StreamingAnalyzer()
+    parser = make_feed_parser(target, name)
+    for i in range(0, len(html), chunk):
+        parser.feed(html[i:i + chunk])
+    return close_feed(parser, target)
+
+
+SCRIPTS_PAGE = (
+    "<html><body><h1>Scripted page</h1>"
+    + "<p>alpha beta gamma</p><script>if (a < b) { run('</p>'); }</script><style>p { color: red }</style>" * 200
+    + "</body></html>"
+)
+
+
+@pytest.mark.parametrize("name", FEED_PARSERS)
+def test_raw_text_end_tags_split_across_chunks(name):
+    expected = parse_page(SCRIPTS_PAGE, "html.parser")
+    for chunk in range(1, 120):
+        page = _stream(SCRIPTS_PAGE, name, chunk)
+        assert (page.word_count, page.h1) == (expected.word_count, expected.h1), chunk
+
+
+def test_analyze_stream_at_real_chunk_sizes():
+    body = ("<html><body>" + "<p>one two three four five</p><script>var s = 1;</script>" * 3000 + "</body></html>").encode()
+
+    async def chunks(size):
+        for i in range(0, len(body), size):
+            yield body[i:i + size]
+
+    for size in range(65536 - 29, 65536 + 29):
+        result = asyncio.run(analyze_stream(chunks(size)))
+        assert result.page.word_count == 15000
+        assert not result.truncated
+
+
+def test_streamed_page_keeps_term_counts_not_tokens():
+    html = "<html><body>" + "<p>seo audit tool for page speed</p>" * 50 + "</body></html>"
+    page = _stream(html, "html.parser", 64)
+    assert page.tokens == []
+    assert page_terms(page) == term_counts(parse_page(html, "html.parser").tokens)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_term_counter_matches_term_counts(monkeypatch, use_numpy):
+    monkeypatch.setattr(keywords, "TERM_BATCH", 50)
+    monkeypatch.setattr(keywords, "_np", None if use_numpy else False)
+    rng = random.Random(3)
+    words = "the seo audit tool of speed page 1 and crawl index".split()
+    for _ in range(50):
+        tokens = [rng.choice(words) for _ in range(rng.randrange(400))]
+        counter, i = TermCounter(), 0
+        while i < len(tokens):
+            step = rng.randrange(1, 30)
+            counter.add(tokens[i:i + step])
+            i += step
+        assert counter.counts() == _counts_python(tokens, keywords.MAX_NGRAM)
+
+
+def test_term_counter_vocabulary_is_bounded():
+    counter = TermCounter(max_vocab=100)
+    counter.add([f"word{i}" for i in range(1000)] * 2)
+    counts = counter.counts()
+    assert counter.pruned and len(counter.vocab) == 100
+    assert len(counts) <= 100 + 2 * 100